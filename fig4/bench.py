@@ -0,0 +1,27 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import mesarx
+from sweep import T0, M0, scenarios, params
+
+# benchmark settings
+window = 1e3                        # integration time per run (yr)
+intervals = np.array([1e-1, 1e0, 1e1, 1e2])
+reps = 5                            # timed repetitions per case
+warmup = 1                          # untimed runs per case
+
+if __name__ == '__main__':
+    results = []
+    for name, planet in scenarios.items():
+        for interval in intervals:
+            case = dict(scenario=name, track='{}/input'.format(name), T0=T0,
+                        M0=M0, planet=planet, tmax=window, interval=interval,
+                        params=params, schedule=True)
+            result = mesarx.benchmark(case, reps=reps, warmup=warmup)
+            results.append(result)
+            print('{scenario:>10} {interval:8.0e} yr: {median:8.3f} s '
+                  '(+/- {std:.3f}), {steps_per_s:9.0f} steps/s, '
+                  '{overhead:5.1%} overhead'.format(**result))
+    mesarx.writebench(results, 'bench.jsonl') # append, tagged with commit
@@ -0,0 +1,42 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import mesarx
+
+# initialize constants
+T0 = 12388.5e6          # Sun's age ~ 5 Myr pre-TRGB (sim start)
+M0 = 0.8868357536545315 # initial mass of star
+tmax = 5e6              # max sim integration time
+intervals = np.array([1e-1, 1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6])
+scenarios = {'engulfment': dict(m=3e-6, a=0.7, r=4e-5),
+             'expansion': dict(m=1e-3, a=5)}
+params = dict(tctl_k1=0.038, # ~ lambda_2, Schroder & Smith (2008)
+              Omega=0)       # explicitly set to 0 (would be 0 by default)
+cache = mesarx.RunCache('../.runcache', max_bytes=2e9) # LRU beyond 2 GB
+
+if __name__ == '__main__':
+    cases = [dict(scenario=name, track='{}/input'.format(name), T0=T0, M0=M0,
+                  planet=planet, tmax=tmax, interval=interval, params=params,
+                  schedule=True)
+             for name, planet in scenarios.items() for interval in intervals]
+    results = mesarx.sweep(cases, cost=mesarx.interval_cost, cache=cache)
+    mesarx.makesubdir('output')     # keeps the published data files intact
+    mesarx.writetable(results, ['scenario', 'interval', 't', 'a_f',
+                                'collision', 'runtime', 'max_mem'],
+                      'output/sweep.txt')
+
+    # fout, in the format read by fig4.py
+    eng = [r for r in results if r['scenario'] == 'engulfment']
+    exp = [r for r in results if r['scenario'] == 'expansion']
+    engulf_times = np.array([r['t'] if r['collision'] else 0. for r in eng])
+    mesarx.writetxt(intervals, engulf_times, 'output/engulftimes.txt')
+    finalas = np.array([r['a_f'] for r in exp])
+    mesarx.writetxt(intervals, finalas, 'output/finalas.txt')
+    for prefix, rows in (('eng', eng), ('exp', exp)):
+        runtimes = np.array([r['runtime'] for r in rows])
+        max_mems = np.array([r['max_mem'] for r in rows])
+        path = 'output/{}_{{}}.txt'.format(prefix)
+        mesarx.writetxt(intervals, runtimes, path.format('runtimes'))
+        mesarx.writetxt(intervals, max_mems, path.format('maxmems'))
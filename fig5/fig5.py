@@ -1,31 +1,36 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import mesarx
 
-# load REBOUND data
-data = np.loadtxt('tides_on/1Mearth/output/m.txt')  # return (N, 2) array
-ts = data[:, 0]/1e6                                 # return only 1st col
-mass = data[:, 1]                                   # return only 2nd col
-data = np.loadtxt('tides_on/1Mearth/output/r.txt')
-radius = data[:, 1]                                 # data in AU
+# load REBOUND data, reduced to what the figure resolves (see loadplot)
+width = 13*300                                      # figure width in pixels
+ts, radius = mesarx.loadplot('tides_on/1Mearth/output/r.txt', width) # AU
+ts = ts/1e6
 init_as = np.arange(0.4, 1.51, 0.2)                 # in AU
-aT1 = np.zeros([ts.size, init_as.size])
-aT10 = np.zeros([ts.size, init_as.size])
-aT100 = np.zeros([ts.size, init_as.size])
-a1 = np.zeros([ts.size, init_as.size])
-for i,init_a in enumerate(init_as):
-    fname = 'tides_on/1Mearth/output/{:.1f}au.txt'.format(init_a)
-    data = np.loadtxt(fname)
-    aT1[:, i] = data[:, 1]
-    fname = 'tides_on/10Mearth/output/{:.1f}au.txt'.format(init_a)
-    data = np.loadtxt(fname)
-    aT10[:, i] = data[:, 1]
-    fname = 'tides_on/100Mearth/output/{:.1f}au.txt'.format(init_a)
-    data = np.loadtxt(fname)
-    aT100[:, i] = data[:, 1]
-    fname = 'tides_off/1Mearth/output/{:.1f}au.txt'.format(init_a)
-    data = np.loadtxt(fname)
-    a1[:, i] = data[:, 1]
+
+def semiaxes(outdir):
+    # (time / Myr, semiaxis) of each orbit, from the columnar results file
+    # written by survey.py if present, else from the per-orbit text files
+    results = outdir + '/results.npz'
+    series = []
+    for init_a in init_as:
+        name = '{:.1f}au'.format(init_a)
+        if os.path.exists(results):
+            t, a = mesarx.loadplot(results, width, column=name)
+        else:
+            t, a = mesarx.loadplot('{}/{}.txt'.format(outdir, name), width)
+        series.append((t/1e6, a))
+    return series
+
+aT1 = semiaxes('tides_on/1Mearth/output')
+aT10 = semiaxes('tides_on/10Mearth/output')
+aT100 = semiaxes('tides_on/100Mearth/output')
+a1 = semiaxes('tides_off/1Mearth/output')
 
 props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
 fig, ax1 = plt.subplots(figsize=(13, 8), dpi=300)
@@ -38,19 +43,19 @@ ax1.xaxis.set_minor_locator(mticker.AutoMinorLocator())
 ax1.yaxis.set_minor_locator(mticker.AutoMinorLocator())
 ax1.plot(ts,radius, color='black', lw=4, label='$R_{Sun}(t)$',)
 # Single points for grayscale legend
-ax1.plot(ts[0],a1[0, 0], '--', color='tab:gray', lw=1, label='Tides OFF')
-ax1.plot(ts[0],aT1[0, 0], color='tab:gray', lw=1,
+ax1.plot(ts[0],a1[0][1][0], '--', color='tab:gray', lw=1, label='Tides OFF')
+ax1.plot(ts[0],aT1[0][1][0], color='tab:gray', lw=1,
          label='1 $M_\oplus$, Tides ON')
-ax1.plot(ts[0],aT10[0, 0], color='tab:gray', lw=2,
+ax1.plot(ts[0],aT10[0][1][0], color='tab:gray', lw=2,
          label='10 $M_\oplus$, Tides ON')
-ax1.plot(ts[0],aT100[0, 0], color='tab:gray', lw=3,
+ax1.plot(ts[0],aT100[0][1][0], color='tab:gray', lw=3,
          label='100 $M_\oplus$, Tides ON')
 # Planet semimajor axes plots
 for i,init_a in enumerate(init_as):
-    ax1.plot(ts,a1[:, i], '--', color=cmap(i), lw=1)
-    ax1.plot(ts,aT1[:, i], color=cmap(i), lw=1)
-    ax1.plot(ts,aT10[:, i], color=cmap(i), lw=2)
-    ax1.plot(ts,aT100[:, i], color=cmap(i), lw=3)
+    ax1.plot(*a1[i], '--', color=cmap(i), lw=1)
+    ax1.plot(*aT1[i], color=cmap(i), lw=1)
+    ax1.plot(*aT10[i], color=cmap(i), lw=2)
+    ax1.plot(*aT100[i], color=cmap(i), lw=3)
 ax1.legend(fontsize='x-large', loc='best', labelspacing=0.1, framealpha=1.0)
 ax1.grid()
 
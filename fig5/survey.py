@@ -0,0 +1,114 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import mesarx
+
+# initialize constants
+T0 = 12388.5e6                      # Sun's age ~ 5 Myr pre-TRGB (sim start)
+M0 = 0.8868357536545315             # initial mass of star
+base = dict(track='tides_on/1Mearth/input', T0=T0, M0=M0, tmax=5e6,
+            interval=1e2,           # 10²-yr param update interval
+            record=True, schedule=True)
+params = dict(tctl_k1=0.038,        # ~ lambda_2, Schroder & Smith (2008)
+              Omega=0)              # explicitly set to 0 (default)
+masses = {1: 3e-6, 10: 3e-5, 100: 3e-4} # Mearth: Msun
+init_as = np.arange(0.4, 1.51, 0.1) # in AU
+ensemble = False                    # all init_as in one sim per mass/tides
+secular = False                     # orbit-averaged equations, not N-body
+prescreen = False                   # skip cells whose fate is certain
+critical = False                    # search the engulfment boundary instead
+tol = 1e-3                          # of the critical semiaxis, in AU
+cache = mesarx.RunCache('../.runcache', max_bytes=2e9) # LRU beyond 2 GB
+
+def outdir(tides, m):
+    mearth = [k for k, mass in masses.items() if mass == m][0]
+    return 'tides_{}/{}Mearth/output'.format('on' if tides else 'off', mearth)
+
+def writeout(tides, m, init_a, ts, a):
+    # write semiaxis vs sim.t, as read by fig5.py
+    mesarx.makesubdir(outdir(tides, m))
+    fname = '{}/{:.1f}au.txt'.format(outdir(tides, m), init_a)
+    mesarx.writetxt(ts, a, path=fname)
+
+def source(r):
+    # how a cell's orbit was computed
+    if 'screen' in r:
+        return 'analytic'               # settled by the pre-screen
+    if ensemble:
+        return 'ensemble'               # N-body, all init_as in one sim
+    if secular:
+        return 'secular'
+    return r.get('integrator', 'ias15')
+
+def writeresults(tides, m, ts, columns, sources):
+    # all orbits of one mass/tides pair in a single columnar file, with the
+    # source of each column
+    mesarx.writeresults(outdir(tides, m) + '/results.npz', ts, columns,
+                        T0=T0, M0=M0, m=m, interval=base['interval'],
+                        tides=tides, sources=sources)
+
+def search(axes):
+    # pin the critical init_a of each mass/tides pair to within tol
+    func = mesarx.run_secular if secular else mesarx.run_case
+    rows = []
+    for case in mesarx.grid(dict(base, record=False), **axes):
+        if case['tides']:
+            case['params'] = params
+        store = 'critical.{}.store'.format(func.__name__) # one per engine
+        r = mesarx.critical_a(case, init_as[0], init_as[-1], tol, func,
+                              store=store, keys=list(axes),
+                              cache=cache)
+        print('tides={} m={}: a_crit = {:.4f} AU ({} runs)'.format(
+            case['tides'], case['m'], r['a_crit'], len(r['runs'])))
+        rows.append(dict(r, tides=case['tides'], m=case['m']))
+    mesarx.writetable(rows, ['tides', 'm', 'a_crit', 'lo', 'hi', 'rounds'],
+                      'critical_a.txt')
+
+if __name__ == '__main__':
+    axes = dict(tides=[False, True], m=list(masses.values()))
+    if critical:
+        search(axes)
+        sys.exit()
+    if ensemble:
+        cases = mesarx.grid(dict(base, a=init_as), **axes)
+        func, store = mesarx.run_ensemble, 'ensemble.store'
+    elif secular:
+        axes['a'] = init_as
+        cases = mesarx.grid(dict(base, check=1), **axes) # 1 N-body check
+        func, store = mesarx.run_secular, 'secular.store'
+    else:
+        axes['a'] = init_as
+        cases = mesarx.grid(base, **axes)
+        func, store = mesarx.run_case, 'survey.store'
+    for case in cases:
+        if case['tides']:
+            case['params'] = params
+    screened = []
+    if prescreen and not ensemble:
+        cases, screened = mesarx.prescreen(cases)
+        print('{} of {} cells pre-screened'.format(len(screened),
+                                                   len(cases) + len(screened)))
+    results = mesarx.survey(cases, store, list(axes), func,
+                            cache=cache) + screened
+
+    runs = {}
+    for r in results:
+        if 'error' in r:
+            print('{} failed:\n{}'.format(mesarx.cellkey(r, list(axes)),
+                                          r['error']))
+            continue
+        if not r.get('check_ok', True):
+            print('{}: secular and N-body disagree (check_err = {:.3g})'
+                  .format(mesarx.cellkey(r, list(axes)), r['check_err']))
+        ts, columns, sources = runs.setdefault((r['tides'], r['m']),
+                                               (r['ts'], {}, {}))
+        pairs = zip(r['a'], r['as']) if ensemble else [(r['a'], r['as'])]
+        for init_a, a in pairs:
+            writeout(r['tides'], r['m'], init_a, ts, a)
+            name = '{:.1f}au'.format(init_a)
+            columns[name] = a
+            sources[name] = source(r)
+    for (tides, m), (ts, columns, sources) in runs.items():
+        writeresults(tides, m, ts, columns, sources)
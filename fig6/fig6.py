@@ -1,25 +1,25 @@
-import numpy as np
+import os
+import sys
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+import mesarx
 
-# load REBOUND data
-data = np.loadtxt('output/tides/m.txt')  # return (N, 2) array
-ts = data[:, 0]/1e6                      # return only 1st col
-mass = data[:, 1]                        # return only 2nd col
-data = np.loadtxt('output/tides/r.txt')
-radius = data[:, 1]                # data in AU
+# load REBOUND data, reduced to what the figure resolves (see loadplot)
+width = 6*300                                     # figure width in pixels
+def load(fname):
+    t, y = mesarx.loadplot(fname, width)
+    return t/1e6, y
+
+mass = load('output/tides/m.txt')
+radius = load('output/tides/r.txt')               # data in AU
 names = [r'$a_J$', r'$a_S$', r'$a_U$', r'$a_N$']
 namest = [r'$a_{J,tides}$',r'$a_{S,tides}$',r'$a_{U,tides}$',r'$a_{N,tides}$']
 # colors = ['tab:orange', 'tab:red', 'tab:green', 'tab:blue']
 colorst = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red']
-a, at = np.zeros([4, ts.size]), np.zeros([4, ts.size])
-for i in range(4):
-    fname = 'output/a_{:d}.txt'.format(i+1)
-    data = np.loadtxt(fname)
-    a[i, :] = data[:, 1]
-    fname = 'output/tides/a_{:d}.txt'.format(i+1)
-    data = np.loadtxt(fname)
-    at[i, :] = data[:, 1]
+a = [load('output/a_{:d}.txt'.format(i+1)) for i in range(4)]
+at = [load('output/tides/a_{:d}.txt'.format(i+1)) for i in range(4)]
 
 fig, (ax1, ax2) = plt.subplots(nrows=2, ncols=1, sharex=True, figsize=(6, 5),
                                gridspec_kw={'height_ratios': [1, 3]})
@@ -27,7 +27,7 @@ fig.subplots_adjust(hspace=0)
 
 ax1.set_ylabel("$M_{Sun}(t)$ / $M_{\odot}$", fontsize='large')
 ax1.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax1.plot(ts, mass, color='black', label=r'$\eta=0.5$')
+ax1.plot(*mass, color='black', label=r'$\eta=0.5$')
 ax1.grid()
 ax1.legend(fontsize='medium', loc='best', labelspacing=0.1, framealpha=1.0)
 
@@ -38,10 +38,10 @@ ax2.set_yscale('log')
 ax2.set_ylim(1e-2, 1e2)
 # Planet semimajor axes plots
 for i in range(3, -1, -1):
-    ax2.plot(ts, a[i, :], color=colorst[i], label=names[i])
+    ax2.plot(*a[i], color=colorst[i], label=names[i])
     if i == 0:
-        ax2.plot(ts, at[i, :], ':', color='black', label=namest[i])
-ax2.plot(ts,radius, color='black', label='$R_{Sun}(t)$',)
+        ax2.plot(*at[i], ':', color='black', label=namest[i])
+ax2.plot(*radius, color='black', label='$R_{Sun}(t)$',)
 ax2.legend(fontsize='medium', loc=(.0455, .251), labelspacing=0.1, framealpha=1.0)
 ax2.grid()
 
@@ -0,0 +1,29 @@
+"""
+Shared driver for the MESA-REBOUNDx stellar evolution experiments.
+
+The run scripts under ``fig4/``, ``fig5/`` and ``fig6/`` are thin
+configurations on top of this package, which provides the simulation
+factory (`makesim`), the stellar track loader (`loadtrack`), the parameter
+updater (`Star`, `evolve`) and the output sink (`Recorder`, `writetxt`).
+"""
+from .tracks import StellarTrack, loadtrack, loadtxt, calc_taus, derive
+from .mesa import read_history, history_columns, mesa2txt
+from .sim import autointegrator, makeensemble, makesim
+from .evolve import (Star, StellarOperator, adaptive_times, ensemble, evolve,
+                     interpolate, semimajor_axes)
+from .output import (Cadence, Recorder, SeriesRecorder, StreamRecorder,
+                     Triggered, fixed_times, log_times, makesubdir, readmeta,
+                     readresults, writeresults, writetable, writetxt)
+from .checkpoint import Checkpoint
+from .events import Escape, Event, MassBelow, Periastron
+from .perf import (MemorySampler, Profile, memory_usage_psutil, peak_memory,
+                   walltime)
+from .parallel import (cellkey, grid, interval_cost, loadcell, run_case,
+                       run_ensemble, setup_case, survey, sweep)
+from .bench import benchmark, readbench, writebench
+from .secular import SecularModel, crosscheck, run_secular
+from .screen import (ENGULFED, SURVIVES, UNCERTAIN, analytic_orbit, classify,
+                     prescreen)
+from .boundary import critical_a
+from .cache import RunCache
+from .plotdata import loadplot, lttb, minmax
@@ -0,0 +1,127 @@
+"""
+Benchmarks of the integration loop, comparable across commits.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+import rebound
+import reboundx
+from .evolve import evolve, interpolate
+from .parallel import setup_case
+from .perf import Profile
+
+def revision():
+    """
+    Return the git commit of this checkout (with '+' if modified), or None.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short',
+                                          'HEAD'], cwd=root,
+                                         stderr=subprocess.DEVNULL)
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'],
+                                cwd=root, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.decode().strip() + ('+' if dirty else '')
+
+def environment():
+    """
+    Describe the code and machine a benchmark ran on.
+    """
+    return dict(commit=revision(), host=platform.node(),
+                machine=platform.machine(), processor=platform.processor(),
+                python=platform.python_version(), numpy=np.__version__,
+                rebound=rebound.__version__, reboundx=reboundx.__version__)
+
+def _interpolation(star, ts, schedule):
+    # time the stellar parameter interpolation as evolve does it: one
+    # vectorized call per quantity with a schedule, else one per update
+    quantities = [star.mass, star.radius] + ([star.tau] if star.tides else [])
+    start = time.perf_counter()
+    for q in quantities:
+        if schedule:
+            interpolate(star.rebx, q, star.T0 + ts)
+        else:
+            for t in ts:
+                q.interpolate(star.rebx, t=star.T0 + t)
+    return time.perf_counter() - start
+
+def _run(case):
+    sim, star, ts = setup_case(case)
+    interp = _interpolation(star, ts, case.get('schedule', False))
+    profile = Profile()
+    start = time.perf_counter()
+    max_mem, error = evolve(sim, star, ts,
+                            schedule=case.get('schedule', False),
+                            operator=case.get('operator', False),
+                            dt_min=case.get('dt_min'), profile=profile)
+    return dict(runtime=time.perf_counter() - start, steps=sim.steps_done,
+                t=sim.t, updates=int(np.searchsorted(ts, sim.t, 'right')),
+                interp=interp, max_mem=max_mem, phases=profile.times)
+
+def benchmark(case, reps=5, warmup=1):
+    """
+    Time `evolve` on a case with warm-up runs and repetitions.
+
+    Parameters
+    ----------
+    case : dict
+        Run description, as for `run_case`; keep 'tmax' short.
+    reps : int
+        Number of timed repetitions.
+    warmup : int
+        Number of untimed runs first (track loading, caches).
+
+    Returns
+    -------
+    dict
+        The scalar entries of `case` and, over the repetitions, the
+        runtime statistics 'mean', 'std', 'min' and 'median' (s), the
+        timesteps and updates per second, the interpolation time 'interp'
+        (s), the median time of each loop phase 'phases' (s, see
+        `Profile`), the 'overhead' share of the runtime spent outside
+        ``sim.integrate`` and the peak memory 'max_mem' (MB).
+    """
+    for i in range(warmup):
+        _run(case)
+    runs = [_run(case) for i in range(reps)]
+    runtimes = np.array([r['runtime'] for r in runs])
+    median = np.median(runtimes)
+    phases = {name: np.median([r['phases'].get(name, 0.) for r in runs])
+              for name in runs[0]['phases']}
+    result = {k: v for k, v in case.items()
+              if isinstance(v, (str, int, float, bool))}
+    result.update(reps=reps, runtimes=runtimes.tolist(),
+                  mean=runtimes.mean(), std=runtimes.std(ddof=1) if reps > 1
+                  else 0., min=runtimes.min(), median=median,
+                  steps=runs[0]['steps'], updates=runs[0]['updates'],
+                  steps_per_s=runs[0]['steps']/median,
+                  updates_per_s=runs[0]['updates']/median,
+                  interp=np.median([r['interp'] for r in runs]),
+                  phases=phases,
+                  overhead=1. - phases.get('integrate', 0.)/median,
+                  max_mem=max(r['max_mem'] for r in runs))
+    return result
+
+def writebench(results, path='bench.jsonl'):
+    """
+    Append benchmark results to a JSON-lines file, one line per result,
+    tagged with the time of the run and its `environment`.
+    """
+    env = environment()
+    stamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(path, 'a') as f:
+        for result in results:
+            record = dict(env, date=stamp, **result)
+            f.write(json.dumps(record, default=float) + '\n')
+
+def readbench(path='bench.jsonl'):
+    """
+    Read the results appended by `writebench`.
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
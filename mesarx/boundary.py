@@ -0,0 +1,88 @@
+"""
+Search for the engulfment boundary in initial semimajor axis.
+
+Planets inside a critical initial semimajor axis are engulfed and those
+outside survive. Rather than covering a uniform grid, `critical_a` narrows a
+bracket [lo, hi] around that boundary: each round runs `npoints` evenly
+spaced candidates inside the bracket in parallel and keeps the sub-interval
+where the outcome flips, so the bracket shrinks by a factor npoints + 1 per
+round (plain bisection for npoints = 1).
+"""
+import multiprocessing
+import numpy as np
+from .parallel import run_case, survey, sweep
+
+def _engulfed(result):
+    if 'error' in result:
+        raise RuntimeError('run at a = {} failed:\n{}'.format(result['a'],
+                                                              result['error']))
+    return bool(result['collision'])
+
+def critical_a(case, lo, hi, tol=1e-3, func=run_case, npoints=None,
+               processes=None, store=None, keys=(), cache=None):
+    """
+    Locate the critical initial semimajor axis of engulfment.
+
+    Parameters
+    ----------
+    case : dict
+        Run description (see `mesarx.parallel`) without 'a'; recording is
+        not needed, so set ``record=False``.
+    lo, hi : float
+        Initial bracket (AU): the planet must be engulfed at `lo` and survive
+        at `hi`.
+    tol : float
+        Width of the final bracket (AU).
+    func : callable
+        Run function returning 'collision', e.g. `run_case`, `run_secular`
+        or `classify`.
+    npoints : int or None
+        Candidates per round; the number of worker processes (or CPUs) if
+        None.
+    processes : int or None
+        See `sweep`.
+    store : str or None
+        If given, runs are checkpointed to this `survey` store, so an
+        interrupted search resumes without repeating finished runs.
+    keys : sequence of str
+        Case entries that identify the search in the store (e.g. the mass
+        and tide setting); 'a' is appended.
+    cache : RunCache or None
+        See `sweep`.
+
+    Returns
+    -------
+    dict
+        The boundary estimate 'a_crit' (midpoint of the final bracket), the
+        bracket 'lo', 'hi', the number of rounds 'rounds' and every run
+        'runs', sorted by 'a'.
+
+    Raises
+    ------
+    ValueError
+        If the outcomes at `lo` and `hi` do not bracket the boundary.
+    """
+    if npoints is None:
+        npoints = processes or multiprocessing.cpu_count()
+    keys = list(keys) + ['a']
+    def run(as_):
+        cases = [dict(case, a=a) for a in as_]
+        if store is None:
+            return sweep(cases, func, processes, cache=cache)
+        return survey(cases, store, keys, func, processes, cache=cache)
+    runs = run(np.linspace(lo, hi, npoints + 2))
+    if not _engulfed(runs[0]) or _engulfed(runs[-1]):
+        raise ValueError('planet must be engulfed at lo = {} and survive at '
+                         'hi = {}'.format(lo, hi))
+    bracket, rounds = list(runs), 1
+    while True:
+        flip = [_engulfed(r) for r in bracket].index(False) # first survivor
+        lo, hi = bracket[flip - 1]['a'], bracket[flip]['a']
+        if hi - lo <= tol:
+            break
+        inner = run(np.linspace(lo, hi, npoints + 2)[1:-1])
+        bracket = [bracket[flip - 1]] + inner + [bracket[flip]]
+        runs += inner
+        rounds += 1
+    runs.sort(key=lambda r: r['a'])
+    return dict(a_crit=0.5*(lo + hi), lo=lo, hi=hi, rounds=rounds, runs=runs)
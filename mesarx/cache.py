@@ -0,0 +1,183 @@
+"""
+Content-addressed cache of run results.
+
+A run is identified by a hash of everything that determines its outcome: the
+case entries (initial orbit, masses, T0, tmax, interval, integrator and tide
+settings, ...), the contents of its stellar track files (not their path, so
+copies of the same track share results), the run function and the code
+version (the `mesarx` sources and the REBOUND/REBOUNDx versions). Editing
+only the plotting, or one axis of a sweep, therefore reruns only the cells
+that actually changed. Entries are evicted least recently used first once
+the cache exceeds its size limits.
+"""
+import functools
+import hashlib
+import json
+import os
+import numpy as np
+import rebound
+import reboundx
+from .output import loadresult, saveresult
+from .tracks import filehash
+
+_digests = {}                           # per-process track/code digests
+
+def _trackdigest(path):
+    # hash of the track files' contents, memoized by their size and mtime
+    path = os.path.abspath(path)
+    files = sorted(f for f in os.listdir(path) if not f.startswith('.')
+                   and os.path.isfile(os.path.join(path, f)))
+    stats = tuple((f, os.stat(os.path.join(path, f)).st_size,
+                   os.stat(os.path.join(path, f)).st_mtime_ns) for f in files)
+    if _digests.get(path, (None,))[0] != stats:
+        digest = [(f, filehash(os.path.join(path, f))) for f in files]
+        _digests[path] = stats, digest
+    return _digests[path][1]
+
+def version():
+    """
+    Return a digest of the `mesarx` sources and the REBOUND/REBOUNDx versions.
+    """
+    if 'code' not in _digests:
+        root = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.sha1()
+        for fname in sorted(os.listdir(root)):
+            if fname.endswith('.py'):
+                h.update(filehash(os.path.join(root, fname)).encode())
+        h.update(rebound.__version__.encode())
+        h.update(reboundx.__version__.encode())
+        _digests['code'] = h.hexdigest()[:16]
+    return _digests['code']
+
+def _canonical(value):
+    # JSON form of the case entries json cannot encode itself
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, '__dict__'):      # e.g. events
+        return [type(value).__name__, vars(value)]
+    return repr(value)
+
+class RunCache:
+    """
+    Store of run results keyed by a hash of their full configuration.
+
+    Each result is one ``<key>.npz`` file in `path`, written atomically, so
+    worker processes can share the cache. A hit refreshes the entry's
+    modification time, which orders the least-recently-used eviction.
+
+    Parameters
+    ----------
+    path : str
+        Cache directory.
+    max_bytes : float or None
+        Evict entries once their total size exceeds this (bytes).
+    max_entries : int or None
+        Evict entries once there are more than this.
+    """
+    def __init__(self, path='.runcache', max_bytes=None, max_entries=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def key(self, case, func):
+        """
+        Return the hash of running `func` on `case`.
+        """
+        config = dict(case)
+        if 'track' in config:
+            config['track'] = _trackdigest(config['track'])
+        config['func'] = '{}.{}'.format(func.__module__, func.__qualname__)
+        config['version'] = version()
+        text = json.dumps(config, sort_keys=True, default=_canonical)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        """
+        Return the stored outputs of `key`, or None on a miss.
+        """
+        path = self._file(key)
+        try:
+            outputs = loadresult(path)
+            os.utime(path)              # mark as recently used
+        except (OSError, ValueError):   # missing, evicted or corrupt
+            return None
+        return outputs
+
+    def put(self, key, outputs):
+        """
+        Store `outputs` (see `saveresult`) under `key` and evict if needed.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        saveresult(self._file(key), outputs)
+        self.evict()
+
+    def entries(self):
+        """
+        Return (path, size, mtime) of every entry, least recently used first.
+        """
+        entries = []
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if name.endswith('.npz'):
+                path = os.path.join(self.path, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:   # evicted by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda e: e[2])
+
+    def evict(self):
+        """
+        Remove least recently used entries until within the size limits.
+        """
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        while entries and (
+                (self.max_bytes is not None and total > self.max_bytes) or
+                (self.max_entries is not None and
+                 len(entries) > self.max_entries)):
+            path, size, mtime = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        for path, size, mtime in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def wrap(self, func):
+        """
+        Return a picklable version of `func` that reads and fills the cache.
+
+        Results on a hit carry the stored outputs (including the original
+        'runtime' and 'max_mem') and ``cached=True``.
+        """
+        return functools.partial(_cached, self, func)
+
+def _cached(cache, func, case):
+    key = cache.key(case, func)
+    outputs = cache.get(key)
+    if outputs is not None:
+        return dict(case, cached=True, **outputs)
+    result = func(case)
+    if 'error' not in result:
+        cache.put(key, {k: v for k, v in result.items() if k not in case})
+    result['cached'] = False
+    return result
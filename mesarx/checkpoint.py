@@ -0,0 +1,146 @@
+"""
+Checkpoint/restart of long integrations.
+"""
+import os
+import tempfile
+import time
+import numpy as np
+import rebound
+import reboundx
+from .perf import peak_memory
+
+class Checkpoint:
+    """
+    Periodically save the full state of an `evolve` run to one file.
+
+    A checkpoint holds the `rebound.Simulation` and the REBOUNDx effects and
+    particle parameters (both as REBOUND/REBOUNDx binaries), the index of the
+    last completed update and the state of an attached recorder, as well as
+    the wall time and peak memory of the run so far, summed over earlier
+    slots. Files are replaced atomically, so a job killed mid-write leaves
+    the previous checkpoint intact.
+
+    Pass an instance as the `checkpoint` argument of `evolve`; on restart,
+    `load` the saved simulation, rebuild the `Star` on the returned
+    `rebx` (without `Star.setup`, whose parameters are restored) and pass
+    ``start=j + 1`` to `evolve`.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint file (conventionally ending in '.npz').
+    every : int or None
+        Save after every `every` updates.
+    seconds : float or None
+        Save once at least `seconds` of wall time have passed since the last
+        save (e.g. well inside a preemptible slot).
+    recorder : Recorder, StreamRecorder or None
+        Recorder whose buffers are saved with the simulation; see `attach`.
+
+    Attributes
+    ----------
+    elapsed : float
+        Wall time (s) of the slots before this one, read by `load`; the
+        current slot's is counted from the creation of the checkpoint.
+    max_mem : float
+        Peak memory usage (MB) of the slots before this one, read by `load`.
+    """
+    def __init__(self, path, every=None, seconds=None, recorder=None):
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.recorder = recorder
+        self.state = None               # recorder state read by `load`
+        self.nsaves = 0
+        self.elapsed = 0.
+        self.max_mem = 0.
+        self._start = self._last = time.perf_counter()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def attach(self, recorder):
+        """
+        Save `recorder` with the simulation; after `load`, first restore it
+        to the checkpointed rows.
+        """
+        self.recorder = recorder
+        if self.state is not None:
+            recorder.restore(self.state)
+
+    def __call__(self, j, sim, rebx):
+        """
+        Save after update `j` if a checkpoint is due.
+        """
+        due = self.every is not None and (j + 1) % self.every == 0
+        if self.seconds is not None:
+            due |= time.perf_counter() - self._last >= self.seconds
+        if due:
+            self.save(j, sim, rebx)
+
+    def save(self, j, sim, rebx):
+        """
+        Save the state after update `j`.
+        """
+        state = {} if self.recorder is None else self.recorder.state()
+        outdir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(outdir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=outdir) as tmp:
+            simfile = os.path.join(tmp, 'sim.bin')
+            rebxfile = os.path.join(tmp, 'rebx.bin')
+            getattr(sim, 'save_to_file', getattr(sim, 'save', None))(simfile)
+            rebx.save(rebxfile)
+            with open(simfile, 'rb') as f:
+                state['sim'] = np.frombuffer(f.read(), dtype=np.uint8)
+            with open(rebxfile, 'rb') as f:
+                state['rebx'] = np.frombuffer(f.read(), dtype=np.uint8)
+            state['j'] = j
+            state['elapsed'] = self.walltime()
+            state['max_mem'] = max(self.max_mem, peak_memory())
+            fd, part = tempfile.mkstemp(dir=outdir, suffix='.npz')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **state)
+        os.replace(part, self.path)
+        self.nsaves += 1
+        self._last = time.perf_counter()
+
+    def load(self):
+        """
+        Load the last checkpoint.
+
+        Returns
+        -------
+        sim : rebound.Simulation
+        rebx : reboundx.Extras
+        j : int
+            Index of the last completed update; resume with ``start=j + 1``.
+        """
+        with np.load(self.path) as data:
+            state = {k: data[k] for k in data.files}
+        with tempfile.TemporaryDirectory() as tmp:
+            simfile = os.path.join(tmp, 'sim.bin')
+            rebxfile = os.path.join(tmp, 'rebx.bin')
+            state.pop('sim').tofile(simfile)
+            state.pop('rebx').tofile(rebxfile)
+            sim = rebound.Simulation(simfile)
+            rebx = reboundx.Extras(sim, rebxfile)
+        j = int(state.pop('j'))
+        self.elapsed = float(state.pop('elapsed'))
+        self.max_mem = float(state.pop('max_mem'))
+        self.state = state
+        if self.recorder is not None:
+            self.recorder.restore(state)
+        return sim, rebx, j
+
+    def walltime(self):
+        """
+        Return the wall time (s) of the run so far, over all slots.
+        """
+        return self.elapsed + time.perf_counter() - self._start
+
+    def remove(self):
+        """
+        Delete the checkpoint file, e.g. once the run has finished.
+        """
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,201 @@
+"""
+Stopping conditions checked at every parameter update.
+
+An event is checked on the simulation after each update of `evolve`. When it
+fires, the time is refined by bisection within the preceding update step:
+the step is re-integrated from a snapshot of the particles (and the star's
+tau) to trial times, with the stellar parameters interpolated there. The
+event then either stops the run at the refined time or removes its particle
+and lets the run go on.
+Conditions are only sampled at the updates, so one that holds only briefly
+within an update interval (e.g. near apoastron) can be missed.
+"""
+import numpy as np
+import rebound
+
+class Event:
+    """
+    Base class of the events; subclasses define `check`.
+
+    Parameters
+    ----------
+    index : int
+        Index of the particle the event refers to.
+    action : {'stop', 'remove'}
+        Stop the run, or remove particle `index` and continue.
+    name : str or None
+        Label of the event, e.g. in `run_case` results.
+
+    Attributes
+    ----------
+    t : float or None
+        Refined time (sim.t) at which the event fired, None until it has.
+    """
+    name = 'event'
+
+    def __init__(self, index, action='stop', name=None):
+        if action not in ('stop', 'remove'):
+            raise ValueError("action must be 'stop' or 'remove'")
+        self.index = index
+        self.action = action
+        if name is not None:
+            self.name = name
+        self.t = None
+
+    def check(self, sim):
+        """
+        Return whether the event condition holds for `sim`.
+        """
+        raise NotImplementedError
+
+class Periastron(Event):
+    """
+    Planet `index` passes within `factor` stellar radii of star `star`
+    (plus the planet's own radius, as for a direct collision).
+    """
+    name = 'periastron'
+
+    def __init__(self, index, factor=1., star=0, action='stop', name=None):
+        Event.__init__(self, index, action, name)
+        self.factor = factor
+        self.star = star
+
+    def check(self, sim):
+        p, star = sim.particles[self.index], sim.particles[self.star]
+        orbit = p.orbit(primary=star)
+        return orbit.a*(1. - orbit.e) < self.factor*star.r + p.r
+
+class Escape(Event):
+    """
+    Particle `index` is farther than `distance` (AU) from star `star`.
+    """
+    name = 'escape'
+
+    def __init__(self, index, distance, star=0, action='remove', name=None):
+        Event.__init__(self, index, action, name)
+        self.distance = distance
+        self.star = star
+
+    def check(self, sim):
+        p, star = sim.particles[self.index], sim.particles[self.star]
+        d2 = (p.x - star.x)**2 + (p.y - star.y)**2 + (p.z - star.z)**2
+        return d2 > self.distance**2
+
+class MassBelow(Event):
+    """
+    The mass of particle `index` (the star by default) drops below
+    `threshold` (Msun).
+    """
+    name = 'mass'
+
+    def __init__(self, threshold, index=0, action='stop', name=None):
+        Event.__init__(self, index, action, name)
+        self.threshold = threshold
+
+    def check(self, sim):
+        return sim.particles[self.index].m < self.threshold
+
+def snapshot(sim, star=None):
+    """
+    Return a copy of the particle state of `sim`, for `restore`.
+
+    If `star` is given and has tides, its REBOUNDx 'tctl_tau' is included,
+    so a restored step starts from the same stellar state.
+    """
+    xyz, vxvyvz = np.zeros((sim.N, 3)), np.zeros((sim.N, 3))
+    m, r = np.zeros(sim.N), np.zeros(sim.N)
+    sim.serialize_particle_data(xyz=xyz, vxvyvz=vxvyvz, m=m, r=r)
+    tau = None
+    if star is not None and star.tides:
+        tau = star.index, sim.particles[star.index].params['tctl_tau']
+    return sim.t, sim.dt, xyz, vxvyvz, m, r, tau
+
+def restore(sim, state):
+    """
+    Reset `sim` to a `snapshot` (other REBOUNDx parameters are left as they
+    are).
+    """
+    t, dt, xyz, vxvyvz, m, r, tau = state
+    sim.set_serialized_particle_data(xyz=xyz, vxvyvz=vxvyvz, m=m, r=r)
+    if tau is not None:
+        sim.particles[tau[0]].params['tctl_tau'] = tau[1]
+    sim.t = t
+    sim.dt = dt
+    if sim.integrator == 'whfast':
+        sim.ri_whfast.recalculate_coordinates_this_timestep = 1
+
+def _fired(sim, events):
+    fired = []
+    for event in events:
+        try:
+            if event.check(sim):
+                fired.append(event)
+        except ValueError:              # e.g. no orbit of a merged particle
+            fired.append(event)
+    return fired
+
+def handle(sim, star, events, state, j, rtol=1e-3):
+    """
+    Check `events` after update `j` of `evolve` and act on those that fire.
+
+    Parameters
+    ----------
+    sim : rebound.Simulation
+        Simulation at the update time t = sim.t.
+    star : Star
+    events : list of Event
+        Pending events; fired ones are removed from the list.
+    state : tuple
+        `snapshot` of `sim` and `star` at the start of the update step.
+    j : int
+        Index of the update, passed on to `Star.update`.
+    rtol : float
+        Precision of the event times relative to the update step.
+
+    Returns
+    -------
+    bool
+        Whether an event stopped the run, leaving `sim` at its time.
+    """
+    t = sim.t
+    fired = _fired(sim, events)
+    while fired:
+        lo, hi = state[0], t
+        tol = rtol*(hi - lo)
+        while hi - lo > tol:            # bisect for the first firing
+            mid = 0.5*(lo + hi)
+            _advance(sim, star, state, mid)
+            if _fired(sim, fired):
+                hi = mid
+            else:
+                lo = mid
+        _advance(sim, star, state, hi)
+        first = _fired(sim, fired) or fired
+        for event in first:
+            event.t = sim.t
+            events.remove(event)
+        if any(e.action == 'stop' for e in first):
+            return True
+        for index in sorted({e.index for e in first}, reverse=True):
+            sim.remove(index)
+            for event in list(events):  # shift indices past the removed one
+                if event.index == index:
+                    events.remove(event)
+                elif event.index > index:
+                    event.index -= 1
+                if getattr(event, 'star', -1) > index:
+                    event.star -= 1
+        state = snapshot(sim, star)
+        sim.integrate(t)
+        star.update(sim, j)
+        fired = _fired(sim, events)
+    return False
+
+def _advance(sim, star, state, t):
+    # re-integrate the update step from its start to t
+    restore(sim, state)
+    try:
+        sim.integrate(t)
+    except rebound.Collision:
+        pass
+    star.update(sim)
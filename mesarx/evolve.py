@@ -0,0 +1,489 @@
+"""
+Stellar parameter updates and the main integration loop.
+"""
+import contextlib
+import warnings
+import numpy as np
+import rebound
+import reboundx
+from . import events as _events
+from .output import Cadence
+from .perf import NOPROFILE, MemorySampler
+
+def interpolate(rebx, interpolator, t, derivative=False):
+    """
+    Evaluate a REBOUNDx spline `Interpolator` at an array of times.
+
+    Uses the interpolator's own knots and second derivatives, so the result
+    agrees with ``interpolator.interpolate(rebx, t=...)`` to round-off, in one
+    vectorized call instead of one call per time. Times before the first
+    knot (where REBOUNDx extrapolates differently) are passed to the
+    interpolator one by one.
+
+    Parameters
+    ----------
+    rebx : reboundx.Extras
+    interpolator : reboundx.Interpolator
+        Interpolator created with 'spline' interpolation.
+    t : numpy.ndarray
+        Times to evaluate at.
+    derivative : bool
+        Return the time derivative of the spline instead (zero before the
+        first knot).
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    n = interpolator.Nvalues
+    x = np.ctypeslib.as_array(interpolator.times, (n,))
+    y = np.ctypeslib.as_array(interpolator.values, (n,))
+    y2 = np.ctypeslib.as_array(interpolator.y2, (n,))
+    khi = np.clip(np.searchsorted(x, t, side='right'), 1, n - 1)
+    klo = khi - 1
+    h = x[khi] - x[klo]
+    a = (x[khi] - t)/h
+    b = (t - x[klo])/h
+    if derivative:
+        return np.where(t < x[0], 0., (y[khi] - y[klo])/h +
+                        ((1. - 3.*a**2)*y2[klo] + (3.*b**2 - 1.)*y2[khi])*h/6.)
+    values = (a*y[klo] + b*y[khi] +
+              ((a**3 - a)*y2[klo] + (b**3 - b)*y2[khi])*h*h/6.)
+    for i in np.flatnonzero(t < x[0]):
+        values[i] = interpolator.interpolate(rebx, t=t[i])
+    return values
+
+class Star:
+    """
+    Interpolate a `StellarTrack` onto a particle of a REBOUNDx simulation.
+
+    Parameters
+    ----------
+    rebx : reboundx.Extras
+    track : StellarTrack
+    T0 : float
+        Stellar age (yr) at sim.t = 0.
+    tides : bool
+        Whether to update the "tctl_tau" parameter (requires `track.taus`).
+    index : int
+        Index of the star in sim.particles.
+    """
+    def __init__(self, rebx, track, T0, tides=True, index=0):
+        self.rebx = rebx
+        self.track = track
+        self.T0 = T0
+        self.tides = tides
+        self.index = index
+        self.mass = reboundx.Interpolator(rebx, track.mtimes, track.masses,
+                                          'spline')
+        self.radius = reboundx.Interpolator(rebx, track.rtimes, track.radii,
+                                            'spline')
+        if tides:
+            self.tau = reboundx.Interpolator(rebx, track.ltimes, track.taus,
+                                             'spline')
+        self.ts = None
+        self.profile = NOPROFILE        # set by evolve(profile=...)
+
+    def schedule(self, ts, blocksize=65536):
+        """
+        Precompute the stellar parameters on the update grid `ts`.
+
+        Afterwards ``update(sim, j)`` reads the values at ``ts[j]`` from
+        contiguous arrays instead of calling the interpolators. The values
+        are evaluated (vectorized) in blocks of `blocksize` updates, so
+        memory stays bounded for very fine grids.
+        """
+        self.ts = ts
+        self.blocksize = blocksize
+        self._block = None
+
+    def _lookup(self, j):
+        b, i = divmod(j, self.blocksize)
+        if b != self._block:
+            start = b*self.blocksize
+            t = self.T0 + self.ts[start:start + self.blocksize]
+            self._table = [interpolate(self.rebx, self.mass, t),
+                           interpolate(self.rebx, self.radius, t)]
+            if self.tides:
+                self._table.append(interpolate(self.rebx, self.tau, t))
+            self._block = b
+        return [column[i] for column in self._table]
+
+    def update(self, sim, j=None):
+        """
+        Set the star's mass, radius (and tau) to their values at T0+sim.t.
+
+        If a `schedule` is set and `j` is given, sim.t must equal ``ts[j]``
+        and the precomputed values are used.
+        """
+        tic = self.profile.start()
+        if j is not None and self.ts is not None:
+            values = self._lookup(j)
+        else:
+            rebx, t = self.rebx, self.T0 + sim.t
+            values = [self.mass.interpolate(rebx, t=t),
+                      self.radius.interpolate(rebx, t=t)]
+            if self.tides:
+                values.append(self.tau.interpolate(rebx, t=t))
+        tic = self.profile.lap('interpolate', tic)
+        p = sim.particles[self.index]
+        p.m, p.r = values[0], values[1]
+        if self.tides:
+            p.params["tctl_tau"] = values[2]
+        self.profile.lap('params', tic)
+
+    def setup(self, sim, **params):
+        """
+        Initialize the star at T0 and set any additional REBOUNDx `params`,
+        e.g. ``tctl_k2=0.038, Omega=0``.
+        """
+        self.update(sim)
+        p = sim.particles[self.index]
+        for name, value in params.items():
+            p.params[name] = value
+
+def adaptive_times(star, tmax, rtol=1e-3, dt_min=0., dt_max=np.inf,
+                   nfine=100000):
+    """
+    Choose parameter update times from the local change of the track.
+
+    Between consecutive updates, the summed relative change of the star's
+    mass, radius (and tau) along the track is kept at about `rtol`, so
+    updates are sparse while the star evolves slowly and dense where it
+    changes quickly (e.g. near the tip of the RGB).
+
+    Parameters
+    ----------
+    star : Star
+    tmax : float
+        Integration time (yr); the grid spans [0, tmax].
+    rtol : float
+        Relative change of the stellar parameters allowed per update.
+    dt_min, dt_max : float
+        Bounds on the spacing of the updates (yr).
+    nfine : int
+        Number of uniform points added to the track's own knots to resolve
+        the change between knots.
+
+    Returns
+    -------
+    numpy.ndarray
+        Update times (sim.t), increasing from 0 to `tmax`.
+    """
+    T0 = star.T0
+    interpolators = [star.mass, star.radius]
+    if star.tides:
+        interpolators.append(star.tau)
+    knots = [np.ctypeslib.as_array(i.times, (i.Nvalues,)) for i in
+             interpolators]
+    fine = np.linspace(0., tmax, nfine)
+    for x in knots:
+        fine = np.union1d(fine, x[(x > T0) & (x < T0 + tmax)] - T0)
+    change = np.zeros(fine.size)
+    for i in interpolators:
+        values = np.abs(interpolate(star.rebx, i, T0 + fine))
+        change[1:] += np.abs(np.diff(np.log(values)))
+    total = np.cumsum(change)           # invert the cumulative change
+    ts = np.interp(np.arange(rtol, total[-1], rtol), total, fine)
+    ts = np.union1d(ts, [0., tmax])
+    if np.isfinite(dt_max):             # split gaps longer than dt_max
+        gaps = np.diff(ts)
+        extra = [np.linspace(t, t + gap, int(np.ceil(gap/dt_max)) + 1)[1:-1]
+                 for t, gap in zip(ts[:-1], gaps) if gap > dt_max]
+        if extra:
+            ts = np.union1d(ts, np.concatenate(extra))
+    if dt_min > 0.:                     # merge updates closer than dt_min
+        keep = [0]
+        for k in range(1, ts.size):
+            if ts[k] - ts[keep[-1]] >= dt_min:
+                keep.append(k)
+        if keep[-1] != ts.size - 1:
+            keep[-1] = ts.size - 1
+        ts = ts[keep]
+    return ts
+
+class StellarOperator:
+    """
+    Apply a `Star`'s track inside the integration as a REBOUNDx operator.
+
+    Registers a custom "updater" operator that sets the star's mass, radius
+    (and tau) from the track after every integrator timestep, so the
+    stellar parameters follow the track continuously and `sim.integrate`
+    need not be stopped to update them. The callback runs in Python at
+    every timestep, so it only pays off when the integrator's steps are few
+    compared with the updates it replaces. To keep its cost down, updates
+    can be restricted to a track-derived cadence `times` (e.g. from
+    `adaptive_times`, which `evolve` uses by default) and to at least
+    `dt_min` (yr) apart; steps in between return immediately.
+
+    REBOUNDx warns that operators changing particles may give spurious
+    results with adaptive timesteps (IAS15): a step rejected by IAS15 is
+    not undone by the operator. Since the star's mass and radius change by
+    a tiny fraction per step, this is harmless here, and `evolve` silences
+    the warning.
+
+    Parameters
+    ----------
+    star : Star
+    dt_min : float
+        Minimum simulation time between updates (0 for no minimum).
+    times : numpy.ndarray or None
+        If given, update only at the first step past each of these times
+        (sim.t); otherwise at every step (subject to `dt_min`).
+    """
+    def __init__(self, star, dt_min=0., times=None):
+        self.star = star
+        self.dt_min = dt_min
+        self.times = times
+        self.t_next = -np.inf
+        self.nupdates = 0
+        self.operator = star.rebx.create_operator("stellar_evolution")
+        self.operator.operator_type = "updater"
+        self.operator.step_function = self.step
+        star.rebx.add_operator(self.operator, dtfraction=1., timing="post")
+
+    def step(self, sim_pointer, operator_pointer, dt):
+        sim = sim_pointer.contents
+        if sim.t < self.t_next:
+            return
+        self.t_next = sim.t + self.dt_min
+        if self.times is not None:
+            k = np.searchsorted(self.times, sim.t, side='right')
+            if k < self.times.size:
+                self.t_next = max(self.t_next, self.times[k])
+            else:
+                self.t_next = np.inf
+        self.star.update(sim)
+        self.nupdates += 1
+
+    def remove(self):
+        """
+        Detach the operator from the simulation.
+        """
+        self.star.rebx.remove_operator(self.operator)
+
+def evolve(sim, star, ts, record=None, whfast_sync=None, schedule=False,
+           operator=False, dt_min=None, checkpoint=None, start=0, events=None,
+           event_rtol=1e-3, outputs=None, mtol=None, stats=None,
+           profile=None):
+    """
+    Integrate `sim` through `ts`, updating `star` after every step.
+
+    Each step recentres the simulation, integrates to the next time in `ts`,
+    updates the stellar parameters and then calls ``record(j, sim)``. A
+    `rebound.Collision` (e.g. engulfment with sim.collision = "direct") ends
+    the loop early with `sim` left at the time of the collision.
+
+    Parameters
+    ----------
+    sim : rebound.Simulation
+    star : Star
+    ts : numpy.ndarray
+        Parameter update times (sim.t).
+    record : callable or None
+        Called as ``record(j, sim)`` after the update at ``ts[j]``.
+    whfast_sync : bool or None
+        Recalculate WHFast's Jacobi coordinates and synchronize after each
+        mass update (required with WHFast's symplectic corrector). If None,
+        done when `sim` runs WHFast with safe mode off.
+    schedule : bool
+        Precompute the stellar parameters on `ts` (see `Star.schedule`)
+        rather than interpolating at every update.
+    operator : bool
+        Update the star at every timestep inside the integration with a
+        `StellarOperator` instead; `ts` then only sets when the simulation
+        is recentred and `record` is called.
+    dt_min : float or None
+        Minimum time between operator updates; see `StellarOperator`. If
+        None, the operator instead updates whenever the track has changed
+        by about 1e-4 (see `adaptive_times`).
+    checkpoint : Checkpoint or None
+        Called as ``checkpoint(j, sim, star.rebx)`` after `record`, to save
+        the run periodically.
+    start : int
+        Index in `ts` to start from, when resuming from a `Checkpoint`.
+    events : list of Event or None
+        Conditions checked after every update (see `mesarx.events`); fired
+        events get their refined time `t` and stop the run or remove their
+        particle.
+    event_rtol : float
+        Precision of the event times relative to the update interval.
+    outputs : numpy.ndarray, Cadence or None
+        Output times for `record`, independent of `ts`; `record` is then
+        called as ``record(k, sim)`` at the k-th output time, integrating to
+        it between updates. By default `record` is called at every update.
+    mtol : float or None
+        Only recentre the simulation and resynchronize WHFast once the
+        star's mass has changed by more than this fraction since they were
+        last done. If None, both are done at every update.
+    stats : dict or None
+        If given, filled with the number of updates that resynchronized
+        ('syncs') and that skipped it under `mtol` ('skipped').
+    profile : Profile or None
+        If given, accumulates the time and calls of each phase of the loop
+        (recentring, integration, interpolation, parameter writes, resync,
+        recording, ...) and of the background memory sampling. With
+        `operator`, the stellar updates are part of 'integrate'.
+
+    Returns
+    -------
+    max_mem : float
+        Peak memory usage (MB), sampled by a `MemorySampler`.
+    collision : rebound.Collision or None
+        The collision that ended the run early, if any.
+    """
+    if operator and checkpoint is not None:
+        raise ValueError("a StellarOperator's Python callback cannot be "
+                         "checkpointed; use operator=False")
+    if schedule:
+        star.schedule(ts)
+    with contextlib.ExitStack() as cleanup: # undone however the run ends
+        if operator:
+            cleanup.enter_context(warnings.catch_warnings())
+            warnings.filterwarnings('ignore',   # see StellarOperator
+                                    message='REBOUNDx: Operators')
+            if dt_min is None:
+                op = StellarOperator(star, times=adaptive_times(star, ts[-1],
+                                                                1e-4))
+            else:
+                op = StellarOperator(star, dt_min)
+            cleanup.callback(op.remove)
+        if whfast_sync is None:
+            whfast_sync = (sim.integrator == 'whfast' and
+                           not sim.ri_whfast.safe_mode)
+        pending = list(events or [])
+        if record is None:
+            outputs = None
+        elif outputs is not None and not isinstance(outputs, Cadence):
+            outputs = Cadence(outputs)
+        if outputs is not None and start > 0:
+            k = outputs.index(ts[start - 1])
+        else:
+            k = 0
+        stats = {} if stats is None else stats
+        stats.update(syncs=0, skipped=0)
+        recentre, mref = True, None
+        prof = NOPROFILE if profile is None else profile
+        if not operator:
+            star.profile = prof
+        collision = None
+        mem = MemorySampler().start()
+        wall = tic = prof.start()
+        try:
+            for j in range(start, ts.size):
+                if recentre:
+                    sim.move_to_com()
+                    tic = prof.lap('move_to_com', tic)
+                if pending:
+                    state = _events.snapshot(sim, star)
+                    tic = prof.lap('events', tic)
+                if outputs is not None:
+                    t0 = sim.t if j > 0 else np.nextafter(sim.t, -np.inf)
+                    tout = outputs.times(t0, ts[j], sim)
+                    for t in tout[tout < ts[j]]:
+                        sim.integrate(t)
+                        tic = prof.lap('integrate', tic)
+                        record(k, sim)
+                        k += 1
+                        tic = prof.lap('record', tic)
+                sim.integrate(ts[j])
+                tic = prof.lap('integrate', tic)
+                if not operator:
+                    star.update(sim, j)     # timed as interpolate and params
+                    tic = prof.start()
+                if pending:
+                    stop = _events.handle(sim, star, pending, state, j,
+                                          event_rtol)
+                    tic = prof.lap('events', tic)
+                    if stop:
+                        break
+                m = sim.particles[star.index].m
+                if mtol is None or mref is None or abs(m - mref) > mtol*mref:
+                    recentre, mref = True, m
+                    stats['syncs'] += 1
+                else:
+                    recentre = False
+                    stats['skipped'] += 1
+                if whfast_sync and recentre:
+                    sim.ri_whfast.recalculate_coordinates_this_timestep = 1
+                    sim.integrator_synchronize()
+                    tic = prof.lap('resync', tic)
+                if record is not None and outputs is None:
+                    record(j, sim)
+                    tic = prof.lap('record', tic)
+                elif outputs is not None and tout.size and tout[-1] == ts[j]:
+                    record(k, sim)
+                    k += 1
+                    tic = prof.lap('record', tic)
+                if checkpoint is not None:
+                    checkpoint(j, sim, star.rebx)
+                    tic = prof.lap('checkpoint', tic)
+        except rebound.Collision as error:
+            collision = error
+        finally:
+            prof.wall += prof.start() - wall
+            mem.stop()
+            prof.add('memory (thread)', mem.elapsed, mem.nsamples)
+            star.profile = NOPROFILE
+    return mem.peak, collision
+
+def semimajor_axes(sim):
+    """
+    Return the semimajor axes of particles 1..N-1 about particle 0.
+    """
+    N = sim.N
+    xyz, vxvyvz, m = np.zeros((N, 3)), np.zeros((N, 3)), np.zeros(N)
+    sim.serialize_particle_data(xyz=xyz, vxvyvz=vxvyvz, m=m)
+    r = np.sqrt(np.sum((xyz[1:] - xyz[0])**2, axis=1))
+    v2 = np.sum((vxvyvz[1:] - vxvyvz[0])**2, axis=1)
+    mu = sim.G*(m[0] + m[1:])
+    return 1./(2./r - v2/mu)
+
+def ensemble(sim, star, ts, schedule=False):
+    """
+    Integrate an ensemble of non-interacting planets around one star.
+
+    The stellar interpolants are evaluated once per update for the whole
+    ensemble (see `makeensemble`). A planet colliding with the star is
+    removed at the time of the collision and the rest continue.
+
+    Parameters
+    ----------
+    sim : rebound.Simulation
+        Simulation from `makeensemble`.
+    star : Star
+    ts : numpy.ndarray
+        Parameter update times (sim.t).
+    schedule : bool
+        Precompute the stellar parameters on `ts`; see `Star.schedule`.
+
+    Returns
+    -------
+    as_ : numpy.ndarray
+        Semimajor axis of each planet at each update, shape (N-1, ts.size);
+        zero after its engulfment.
+    engulf_times : numpy.ndarray
+        Time of each planet's collision with the star (NaN if none).
+    max_mem : float
+        Peak memory usage (MB), sampled by a `MemorySampler`.
+    """
+    Np = sim.N - 1
+    alive = list(range(Np))             # planet no. of particles 1..N-1
+    engulf_times = np.full(Np, np.nan)
+    def resolve(sim_pointer, collision):
+        i, j = collision.p1, collision.p2
+        if i != 0 and j != 0:           # planets do not interact
+            return 0
+        engulf_times[alive.pop(max(i, j) - 1)] = sim_pointer.contents.t
+        return 2 if i == 0 else 1       # remove the planet
+    sim.collision_resolve = resolve
+    as_ = np.zeros((Np, ts.size))
+    if schedule:
+        star.schedule(ts)
+    with MemorySampler() as mem:
+        for j,t in enumerate(ts):
+            sim.integrate(t)
+            star.update(sim, j)
+            if alive:
+                as_[alive, j] = semimajor_axes(sim)
+    return as_, engulf_times, mem.peak
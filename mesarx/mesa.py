@@ -0,0 +1,102 @@
+"""
+Streaming reader for MESA ``history.data`` logs.
+
+A history file has a header block (column numbers, names and values of
+global run data), a blank line, then the column numbers and names of the
+per-model history, followed by one whitespace-separated row per model.
+"""
+import itertools
+import os
+import numpy as np
+from .output import writetxt
+
+COLUMNS = ('star_age', 'star_mass', 'radius', 'luminosity')
+NHEADER = 6                             # lines up to and incl. column names
+
+def history_columns(path):
+    """
+    Return the names of the history columns in the MESA log at `path`.
+    """
+    with open(path) as f:
+        for _ in range(NHEADER - 1):
+            f.readline()
+        return f.readline().split()
+
+def read_history(path, columns=COLUMNS, chunksize=65536, dedup=True):
+    """
+    Read selected columns of a MESA history log in fixed-size chunks.
+
+    Only the requested columns are converted, and at most `chunksize` text
+    rows are held at a time, so the memory footprint is set by the projected
+    output rather than by the full width of the log.
+
+    Parameters
+    ----------
+    path : str
+        Path of the ``history.data`` file.
+    columns : sequence of str
+        Names of the history columns to return, as on line 6 of the log.
+    chunksize : int
+        Number of rows parsed per chunk.
+    dedup : bool
+        Drop rows superseded by a restart or backup (i.e. rows whose
+        model_number is not below that of every later row), as
+        ``mesa_reader`` does, to keep the time series monotonic.
+
+    Returns
+    -------
+    dict of numpy.ndarray
+        One array per requested column name.
+    """
+    names = history_columns(path)
+    missing = [c for c in columns if c not in names]
+    if missing:
+        raise KeyError('{} has no column(s) {}'.format(path,
+                                                       ', '.join(missing)))
+    usecols = [names.index(c) for c in columns]
+    if dedup:
+        usecols.append(names.index('model_number'))
+    chunks = []
+    with open(path) as f:
+        for _ in range(NHEADER):
+            f.readline()
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            if not lines:
+                break
+            chunks.append(np.loadtxt(lines, usecols=usecols, ndmin=2))
+    if chunks:
+        data = np.concatenate(chunks)
+    else:
+        data = np.zeros((0, len(usecols)))
+    if dedup and data.shape[0] > 1:
+        models = data[:, -1]
+        later = np.minimum.accumulate(models[::-1])[::-1] # min of rows i..N
+        keep = np.ones(models.size, dtype=bool)
+        keep[:-1] = models[:-1] < later[1:]
+        data = data[keep]
+    return {c: np.ascontiguousarray(data[:, i]) for i,c in enumerate(columns)}
+
+def mesa2txt(path, outdir='input', files=None, chunksize=65536):
+    """
+    Export stellar tracks from a MESA history log for use with `loadtrack`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the ``history.data`` file.
+    outdir : str
+        Directory to write the two-column (star_age, value) text files to.
+    files : dict or None
+        Map of output filename to history column; defaults to m.txt, r.txt
+        and l.txt from star_mass, radius and luminosity.
+    chunksize : int
+        Number of rows parsed per chunk; see `read_history`.
+    """
+    if files is None:
+        files = {'m.txt': 'star_mass', 'r.txt': 'radius', 'l.txt': 'luminosity'}
+    columns = ['star_age'] + list(files.values())
+    data = read_history(path, columns, chunksize)
+    os.makedirs(outdir, exist_ok=True)
+    for fname, column in files.items():
+        writetxt(data['star_age'], data[column], os.path.join(outdir, fname))
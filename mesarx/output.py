@@ -0,0 +1,413 @@
+"""
+Output sinks for time series and run diagnostics.
+"""
+import json
+import os
+import tempfile
+import numpy as np
+
+def makesubdir(name):
+    if not os.path.exists(name):
+        os.makedirs(name)
+
+def writetxt(times, values, path='data.txt'):
+    """
+    Function to output time-value series data to a two-column text file.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Times to be written out to the first column of the data file.
+    values : numpy.ndarray
+        Values to be written out to the second column of the data file.
+    path : str
+        Path and filename of the data file to be outputted.
+        Default path set to working directory and filename "data.txt"
+    """
+    np.savetxt(path, np.column_stack((times, values)), fmt='%.16E',
+               delimiter='\t')        # will overwrite existing file
+
+class Recorder:
+    """
+    Record quantities of a simulation on a fixed output grid.
+
+    Pass an instance as the `record` argument of `evolve`; at update `j` each
+    named quantity is evaluated on the simulation and stored in row `j`.
+
+    Parameters
+    ----------
+    ts : numpy.ndarray
+        Output times (sim.t), one per update step.
+    **quantities : callable
+        Functions of the simulation returning the value to record, e.g.
+        ``a=lambda sim: sim.particles[1].a``.
+    """
+    def __init__(self, ts, **quantities):
+        self.ts = ts
+        self.quantities = quantities
+        self.data = {name: np.zeros(ts.size) for name in quantities}
+
+    def __call__(self, j, sim):
+        for name, f in self.quantities.items():
+            self.data[name][j] = f(sim)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def write(self, name, path):
+        """
+        Write the recorded quantity `name` against `ts` to `path`.
+        """
+        writetxt(self.ts, self.data[name], path)
+
+    def save(self, path, **meta):
+        """
+        Write all recorded quantities to one columnar results file; see
+        `writeresults`.
+        """
+        writeresults(path, self.ts, self.data, **meta)
+
+    def state(self):
+        """
+        Return the recorded arrays, for a `Checkpoint`.
+        """
+        return {'data_' + name: data for name, data in self.data.items()}
+
+    def restore(self, state):
+        """
+        Restore the arrays returned by `state`.
+        """
+        for name in self.data:
+            self.data[name][:] = state['data_' + name]
+
+class StreamRecorder:
+    """
+    Record quantities of a simulation straight to disk in fixed-size chunks.
+
+    A drop-in alternative to `Recorder` for long runs: each quantity is
+    buffered in a `chunk`-row array and appended to its own two-column
+    (time, value) text file, in the format of `writetxt`, whenever the
+    buffer fills. Memory is O(chunk) instead of O(len(ts)), and rows
+    already flushed survive an aborted run. Used as a context manager, it
+    closes the files on exit, padding the unrecorded rows with zeros only
+    if the run completed, so an aborted run does not look finished.
+
+    Parameters
+    ----------
+    ts : numpy.ndarray
+        Output times (sim.t), one per update step.
+    paths : dict
+        Output file of each quantity.
+    chunk : int
+        Number of rows buffered per quantity between writes.
+    append : bool
+        Open existing output files for appending instead of overwriting them,
+        when resuming from a `Checkpoint` (which truncates them to the
+        checkpointed rows).
+    **quantities : callable
+        Functions of the simulation returning the value to record.
+    """
+    def __init__(self, ts, paths, chunk=4096, append=False, **quantities):
+        self.ts = ts
+        self.quantities = quantities
+        self.chunk = chunk
+        mode = 'a' if append else 'w'
+        self.files = {name: open(paths[name], mode) for name in quantities}
+        self.buffer = np.zeros((len(quantities), chunk))
+        self.start = 0                  # index of first buffered row
+        self.n = 0                      # number of buffered rows
+
+    def __call__(self, j, sim):
+        if j != self.start + self.n:    # rows not recorded stay zero
+            self.flush()
+            self._pad(j)
+        for k, f in enumerate(self.quantities.values()):
+            self.buffer[k, self.n] = f(sim)
+        self.n += 1
+        if self.n == self.chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered rows to the output files.
+        """
+        ts = self.ts[self.start:self.start + self.n]
+        for k, f in enumerate(self.files.values()):
+            np.savetxt(f, np.column_stack((ts, self.buffer[k, :self.n])),
+                       fmt='%.16E', delimiter='\t')
+            f.flush()
+        self.start += self.n
+        self.n = 0
+
+    def state(self):
+        """
+        Flush and return the file offsets, for a `Checkpoint`.
+        """
+        self.flush()
+        state = {'offset_' + name: f.tell() for name, f in self.files.items()}
+        state['start'] = self.start
+        return state
+
+    def restore(self, state):
+        """
+        Truncate the output files to the rows recorded at `state`.
+        """
+        for name, f in self.files.items():
+            f.truncate(int(state['offset_' + name]))
+        self.start = int(state['start'])
+        self.n = 0
+
+    def _pad(self, j):
+        # write zero rows up to (excluding) row j, a chunk at a time
+        while self.start < j:
+            self.n = min(self.chunk, j - self.start)
+            self.buffer[:, :self.n] = 0.
+            self.flush()
+
+    def close(self, pad=True):
+        """
+        Flush and close the output files. With `pad`, rows never recorded
+        (e.g. after a collision) are written as zeros, as `Recorder` does.
+        """
+        self.flush()
+        if pad:
+            self._pad(self.ts.size)
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(pad=exc[0] is None)  # a partial run stays partial
+
+class SeriesRecorder:
+    """
+    Record quantities at whatever times `record` is called.
+
+    For output cadences whose length is not known in advance (see
+    `Triggered`): each call appends sim.t and the quantities.
+
+    Parameters
+    ----------
+    **quantities : callable
+        Functions of the simulation returning the value to record.
+    """
+    def __init__(self, **quantities):
+        self.quantities = quantities
+        self.times = []
+        self.data = {name: [] for name in quantities}
+
+    def __call__(self, k, sim):
+        self.times.append(sim.t)
+        for name, f in self.quantities.items():
+            self.data[name].append(f(sim))
+
+    def __getitem__(self, name):
+        return np.array(self.data[name])
+
+    @property
+    def ts(self):
+        return np.array(self.times)
+
+    def write(self, name, path):
+        """
+        Write the recorded quantity `name` against its times to `path`.
+        """
+        writetxt(self.ts, self[name], path)
+
+    def save(self, path, **meta):
+        """
+        Write all recorded quantities to one columnar results file.
+        """
+        writeresults(path, self.ts, {name: self[name] for name in self.data},
+                     **meta)
+
+def fixed_times(tmax, dt, t0=0.):
+    """
+    Return output times every `dt` from `t0` up to `tmax`.
+    """
+    return t0 + dt*np.arange(int(np.floor((tmax - t0)/dt + 1e-9)) + 1)
+
+def log_times(tmin, tmax, num, t0=0.):
+    """
+    Return `num` output times log-spaced in time since `t0`, from `tmin` to
+    `tmax`, preceded by `t0` itself.
+    """
+    return np.concatenate(([t0], t0 + np.geomspace(tmin, tmax - t0, num)))
+
+class Cadence:
+    """
+    Output times for `evolve`, independent of the parameter update grid.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Sorted output times (sim.t), e.g. from `fixed_times` or `log_times`.
+    """
+    def __init__(self, times):
+        self.ts = np.asarray(times, dtype=float)
+
+    def index(self, t):
+        """
+        Return the number of output times up to and including `t`.
+        """
+        return int(np.searchsorted(self.ts, t, side='right'))
+
+    def times(self, t0, t1, sim):
+        """
+        Return the output times in (t0, t1], given `sim` at t0.
+        """
+        return self.ts[self.index(t0):self.index(t1)]
+
+class Triggered(Cadence):
+    """
+    A `Cadence` that adds samples every `dt` once `event` holds.
+
+    The event (e.g. ``Periastron(1, factor=1.5)``) is checked at the start of
+    each update interval; from then on the output is dense, e.g. to resolve
+    the approach to engulfment. Record with a `SeriesRecorder`.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Regular output times.
+    event : Event
+        Trigger condition (its action is ignored).
+    dt : float
+        Dense output interval.
+    """
+    def __init__(self, times, event, dt):
+        Cadence.__init__(self, times)
+        self.event = event
+        self.dt = dt
+        self.t = None                   # time dense output started
+
+    def times(self, t0, t1, sim):
+        ts = Cadence.times(self, t0, t1, sim)
+        if self.t is None and self.event.check(sim):
+            self.t = t0
+        if self.t is None:
+            return ts
+        dense = t0 + self.dt*np.arange(1, int((t1 - t0)/self.dt) + 1)
+        return np.union1d(ts, dense[dense <= t1])
+
+def writetable(rows, columns, path='table.txt'):
+    """
+    Write a list of result dicts as a tab-separated table with a header.
+
+    Parameters
+    ----------
+    rows : list of dict
+        One dict per row, e.g. the results of `sweep`.
+    columns : list of str
+        Keys to write, in order. Floats are written as '%.16E'.
+    path : str
+        Path and filename of the table.
+    """
+    def fmt(value):
+        if isinstance(value, (float, np.floating)):
+            return '%.16E' % value
+        return str(value)
+    with open(path, 'w') as f:
+        f.write('# ' + '\t'.join(columns) + '\n')
+        for row in rows:
+            f.write('\t'.join(fmt(row[c]) for c in columns) + '\n')
+
+def writeresults(path, ts, columns, **meta):
+    """
+    Write the time series of a run to a single columnar results file.
+
+    The file is an uncompressed ``.npz`` holding the time column 't' once,
+    one array per quantity and the run metadata as JSON, so readers can
+    load individual columns without parsing the others.
+
+    Parameters
+    ----------
+    path : str
+        Path of the results file (conventionally ending in '.npz').
+    ts : numpy.ndarray
+        Output times.
+    columns : dict of numpy.ndarray
+        One array per quantity, each the length of `ts`.
+    **meta
+        JSON-serializable run metadata, e.g. ``T0=T0, interval=1e2,
+        integrator='ias15', tides=True``.
+    """
+    if 't' in columns or 'meta' in columns:
+        raise ValueError("'t' and 'meta' are reserved column names")
+    with open(path, 'wb') as f:
+        np.savez(f, t=ts, meta=np.array(json.dumps(meta)), **columns)
+
+def readresults(path, names=None):
+    """
+    Read columns from a results file written by `writeresults`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the results file.
+    names : list of str or None
+        Columns to read; all if None.
+
+    Returns
+    -------
+    ts : numpy.ndarray
+    columns : dict of numpy.ndarray
+    """
+    with np.load(path) as data:
+        if names is None:
+            names = [k for k in data.files if k not in ('t', 'meta')]
+        return data['t'], {name: data[name] for name in names}
+
+def readmeta(path):
+    """
+    Return the metadata dict of a results file written by `writeresults`.
+    """
+    with np.load(path) as data:
+        return json.loads(str(data['meta']))
+
+def saveresult(path, result):
+    """
+    Save a result dict (e.g. of `run_case`) to an ``.npz`` file atomically.
+
+    Numeric, boolean and string entries are stored as arrays, and other
+    JSON-serializable entries (e.g. the 'params' dict) together as JSON;
+    entries that are neither (e.g. events) are skipped.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file; its directory must exist.
+    result : dict
+    """
+    arrays, other = {}, {}
+    for k, v in result.items():
+        try:
+            array = np.asarray(v)
+        except ValueError:              # ragged sequences
+            array = np.empty(0, dtype=object)
+        if array.dtype != object:
+            arrays[k] = array
+            continue
+        try:
+            json.dumps(v)
+        except TypeError:
+            continue
+        other[k] = v
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, _json=np.array(json.dumps(other)), **arrays)
+    os.replace(tmp, path)
+
+def loadresult(path):
+    """
+    Load a result dict saved by `saveresult`, with scalars unwrapped.
+    """
+    with np.load(path) as data:
+        result = {k: data[k][()] if data[k].ndim == 0 else data[k]
+                  for k in data.files if k != '_json'}
+        if '_json' in data.files:
+            result.update(json.loads(str(data['_json'])))
+    return result
@@ -0,0 +1,358 @@
+"""
+Parallel execution of independent star-planet runs.
+
+A run ("case") is described by a plain dict so that it can be pickled to a
+worker process:
+
+    track : str
+        Directory of the MESA tracks, see `loadtrack`.
+    T0 : float
+        Stellar age (yr) at sim.t = 0.
+    M0 : float
+        Initial stellar mass (Msun).
+    planet : dict
+        Keyword arguments of the planet for `rebound.Simulation.add`.
+    m, a : float, optional
+        Planet mass (Msun) and initial semimajor axis (AU), overriding those
+        in `planet` (convenient as `grid` axes).
+    tmax : float
+        Integration time (yr).
+    interval : float
+        Parameter update interval (yr).
+    tides : bool, optional
+        Whether to add "tides_constant_time_lag" (default True).
+    integrator : str, optional
+        REBOUND integrator (default IAS15), or 'auto' to pick it and its
+        timestep with `autointegrator`.
+    dt : float, optional
+        Timestep (yr) of a fixed-step `integrator`.
+    params : dict, optional
+        Additional REBOUNDx parameters of the star, e.g. {"tctl_k1": 0.038}.
+    record : bool, optional
+        Whether to record the planet's semimajor axis at every update.
+    schedule : bool, optional
+        Whether to precompute the stellar parameters on the update grid
+        (see `Star.schedule`).
+    operator : bool, optional
+        Whether to update the star at every timestep inside the integration
+        (see `StellarOperator`); `interval` then only sets the output grid.
+    dt_min : float, optional
+        Minimum time between operator updates (default: updates at a
+        track-derived cadence, see `evolve`).
+    rtol : float, optional
+        If set, space the updates adaptively by the relative change of the
+        track (see `adaptive_times`), with `interval` as the longest gap.
+    output : float, optional
+        Output interval (yr) of the recorded semimajor axes, independent of
+        the update grid (default: record at every update).
+    events : list of Event, optional
+        Stopping conditions (see `mesarx.events`); the refined time of each
+        is returned as 't_<name>' (NaN if it never fired).
+"""
+import copy
+import functools
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+import numpy as np
+from .evolve import Star, adaptive_times, ensemble, evolve
+from .output import (Recorder, fixed_times, loadresult, makesubdir,
+                     saveresult, writetable)
+from .sim import autointegrator, makeensemble, makesim
+from .tracks import loadtrack
+
+_tracks = {}                            # per-process track memo
+
+def _loadtrack(path):
+    path = os.path.abspath(path)
+    if path not in _tracks:
+        _tracks[path] = loadtrack(path)
+    return _tracks[path]
+
+def setup_case(case):
+    """
+    Build the simulation, star and update times of a case.
+
+    Parameters
+    ----------
+    case : dict
+        Run description; see the module docstring.
+
+    Returns
+    -------
+    sim : rebound.Simulation
+    star : Star
+    ts : numpy.ndarray
+        Parameter update times.
+    """
+    tides = case.get('tides', True)
+    track = _loadtrack(case['track'])
+    planet = dict(case.get('planet', {}))
+    for k in ('m', 'a'):
+        if k in case:
+            planet[k] = case[k]
+    sim, rebx = makesim([dict(m=case['M0']), planet], collision="direct",
+                        tides=tides)
+    star = Star(rebx, track, case['T0'], tides=tides)
+    star.setup(sim, **case.get('params', {}))
+    if case.get('integrator') == 'auto':
+        autointegrator(sim, tides)
+    elif case.get('integrator'):
+        sim.integrator = case['integrator']
+        if case.get('dt'):
+            sim.dt = case['dt']
+    if case.get('rtol'):
+        ts = adaptive_times(star, case['tmax'], case['rtol'],
+                            dt_max=case['interval'])
+    else:
+        Nup = int(case['tmax']/case['interval']) # no. of param updates
+        ts = np.linspace(0., case['tmax'], Nup)
+    return sim, star, ts
+
+def output_times(case, ts):
+    """
+    Return the recording times of a case: every `case['output']` yr if
+    set, else the update times `ts` (see `setup_case`).
+    """
+    if case.get('output'):
+        return fixed_times(case['tmax'], case['output'])
+    return ts
+
+def run_case(case):
+    """
+    Integrate a single case and return its results.
+
+    Parameters
+    ----------
+    case : dict
+        Run description; see the module docstring.
+
+    Returns
+    -------
+    dict
+        `case` updated with the end time 't', the planet's final semimajor
+        axis 'a_f', whether the run ended in a 'collision' (e.g. engulfment),
+        its 'runtime' (s) and peak memory 'max_mem' (MB). If `case['record']`
+        is set, also the output times 'ts' and semimajor axes 'as' (zero
+        after a collision), and for each of `case['events']` its time
+        't_<name>'.
+    """
+    timer_start = time.perf_counter()
+    sim, star, ts = setup_case(case)
+    outputs = None
+    if case.get('output'):
+        outputs = fixed_times(case['tmax'], case['output'])
+    record = None
+    if case.get('record'):
+        record = Recorder(output_times(case, ts),
+                          a=lambda sim: sim.particles[1].a)
+    events = copy.deepcopy(case.get('events', []))
+    max_mem, error = evolve(sim, star, ts, record=record,
+                            schedule=case.get('schedule', False),
+                            operator=case.get('operator', False),
+                            dt_min=case.get('dt_min'), events=events,
+                            outputs=outputs)
+    result = dict(case)
+    a_f = sim.particles[1].a if sim.N > 1 else np.nan
+    result.update(t=sim.t, a_f=a_f, collision=error is not None,
+                  runtime=time.perf_counter() - timer_start, max_mem=max_mem)
+    for event in events:
+        result['t_' + event.name] = np.nan if event.t is None else event.t
+    if record is not None:
+        result.update(ts=record.ts, **{'as': record['a']})
+    return result
+
+def run_ensemble(case):
+    """
+    Integrate planets at several initial semimajor axes as one ensemble.
+
+    Parameters
+    ----------
+    case : dict
+        Run description as for `run_case`, except that 'a' is a sequence of
+        initial semimajor axes (AU), one non-interacting planet each.
+
+    Returns
+    -------
+    dict
+        `case` updated with the update times 'ts', the semimajor axes 'as'
+        (one row per planet), their final values 'a_f', engulfment times
+        'engulf_times' (NaN if not engulfed), 'runtime' (s) and peak memory
+        'max_mem' (MB).
+    """
+    timer_start = time.perf_counter()
+    tides = case.get('tides', True)
+    track = _loadtrack(case['track'])
+    planet = dict(case.get('planet', {}))
+    if 'm' in case:
+        planet['m'] = case['m']
+    planets = [dict(planet, a=a) for a in case['a']]
+    sim, rebx = makeensemble(case['M0'], planets, tides=tides)
+    star = Star(rebx, track, case['T0'], tides=tides)
+    star.setup(sim, **case.get('params', {}))
+    Nup = int(case['tmax']/case['interval']) # no. of param updates
+    ts = np.linspace(0., case['tmax'], Nup)
+    as_, engulf_times, max_mem = ensemble(sim, star, ts,
+                                          case.get('schedule', False))
+    result = dict(case)
+    result.update(ts=ts, a_f=as_[:, -1], engulf_times=engulf_times,
+                  runtime=time.perf_counter() - timer_start, max_mem=max_mem,
+                  **{'as': as_})
+    return result
+
+def _run_indexed(item):
+    i, func, case = item
+    return i, func(case)
+
+def sweep(cases, func=run_case, processes=None, cost=None, cache=None):
+    """
+    Run independent cases on a pool of worker processes.
+
+    Parameters
+    ----------
+    cases : list of dict
+        Run descriptions passed to `func`.
+    func : callable
+        Picklable (module-level) function of one case returning its result.
+    processes : int or None
+        Number of worker processes; all cores if None. With 1, the cases
+        run serially in this process.
+    cost : callable or None
+        Estimated relative cost of a case, used to dispatch the most
+        expensive cases first so the pool drains evenly.
+    cache : RunCache or None
+        If given, cases already in the cache are returned from it instead of
+        being run, and new results are added to it.
+
+    Returns
+    -------
+    list
+        Results in the order of `cases`.
+    """
+    if cache is not None:
+        func = cache.wrap(func)
+    order = list(range(len(cases)))
+    if cost is not None:
+        order.sort(key=lambda i: cost(cases[i]), reverse=True)
+    items = [(i, func, cases[i]) for i in order]
+    results = [None] * len(cases)
+    if processes == 1:
+        for item in items:
+            i, result = _run_indexed(item)
+            results[i] = result
+        return results
+    with multiprocessing.Pool(processes) as pool:
+        for i, result in pool.imap_unordered(_run_indexed, items):
+            results[i] = result
+    return results
+
+def interval_cost(case):
+    """
+    Relative cost of a case, proportional to its number of updates.
+    """
+    return case['tmax']/case['interval']
+
+def grid(base, **axes):
+    """
+    Expand the Cartesian product of `axes` into a list of cases.
+
+    Parameters
+    ----------
+    base : dict
+        Entries common to every case.
+    **axes : sequence
+        Values of each varied case entry, e.g. ``a=np.arange(0.4, 1.51, 0.1)``.
+        The last axis varies fastest.
+
+    Returns
+    -------
+    list of dict
+    """
+    names = list(axes)
+    return [dict(base, **dict(zip(names, values)))
+            for values in itertools.product(*axes.values())]
+
+def cellkey(case, keys):
+    """
+    Return the store key of a survey cell, e.g. 'tides=True_m=3e-06_a=0.4'.
+    """
+    def fmt(value):
+        if isinstance(value, (float, np.floating)):
+            return '%.12g' % value      # distinct down to ~1e-11 relative
+        return str(value)
+    return '_'.join('{}={}'.format(k, fmt(case[k])) for k in keys)
+
+def _run_cell(store, keys, func, case):
+    # run one survey cell, checkpointing its result to the store; failures
+    # are returned (not stored) so the cell is retried on the next survey
+    path = os.path.join(store, cellkey(case, keys) + '.npz')
+    try:
+        result = func(case)
+    except Exception:
+        result = dict(case)
+        result['error'] = traceback.format_exc()
+        return result
+    saveresult(path, result)
+    return result
+
+def loadcell(store, case, keys):
+    """
+    Load the stored result of a survey cell, or return None if absent.
+    """
+    path = os.path.join(store, cellkey(case, keys) + '.npz')
+    if not os.path.exists(path):
+        return None
+    return loadresult(path)
+
+def survey(cases, store, keys, func=run_case, processes=None, cost=None,
+           rerun=False, cache=None):
+    """
+    Run a grid of cases in parallel with per-cell checkpointing.
+
+    Each completed cell is written to ``<store>/<cellkey>.npz`` as soon as
+    it finishes, and cells already in the store are loaded rather than run,
+    so an interrupted or partially failed survey resumes where it stopped
+    and a failed cell can be re-run alone. An ``index.txt`` table of all
+    cells is rewritten at the end.
+
+    Parameters
+    ----------
+    cases : list of dict
+        Survey cells, e.g. from `grid`.
+    store : str
+        Directory of the result store.
+    keys : list of str
+        Case entries that identify a cell (the grid axes).
+    func, processes, cost, cache
+        See `sweep`; a cell missing from the store but found in the cache
+        is copied to the store without running.
+    rerun : bool
+        Whether to run all cells again, ignoring stored results.
+
+    Returns
+    -------
+    list of dict
+        Results in the order of `cases`; failed cells carry an 'error'
+        traceback instead of results.
+    """
+    makesubdir(store)
+    if cache is not None:
+        func = cache.wrap(func)
+    results = [None] * len(cases)
+    todo = []
+    for i, case in enumerate(cases):
+        if not rerun:
+            results[i] = loadcell(store, case, keys)
+        if results[i] is None:
+            todo.append(i)
+    run = functools.partial(_run_cell, store, keys, func)
+    for i, result in zip(todo, sweep([cases[i] for i in todo], run,
+                                     processes, cost)):
+        results[i] = result
+    index = [dict(cell=cellkey(r, keys), status='error' if 'error' in r
+                  else 'done', **{k: r[k] for k in keys}) for r in results]
+    writetable(index, ['cell', 'status'] + list(keys),
+               os.path.join(store, 'index.txt'))
+    return results
@@ -0,0 +1,245 @@
+"""
+Runtime and memory usage diagnostics.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+try:
+    import psutil
+except ImportError:                     # optional, for memory tracking
+    psutil = None
+
+def memory_usage_psutil():
+    """
+    Return the resident memory usage of this process in MB (NaN if psutil
+    is unavailable).
+    """
+    if psutil is None:
+        return float('nan')
+    process = psutil.Process(os.getpid())
+    mem = process.memory_info()[0] / float(2 ** 20)
+    return mem
+
+def peak_memory():
+    """
+    Return the peak resident memory usage of this process so far in MB (NaN
+    where the `resource` module is unavailable, e.g. on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':        # bytes, not kB
+        peak /= 1024.
+    return peak / 1024.
+
+def _statm_reader():
+    # return a function giving the resident set size in MB, read directly
+    # from /proc/self/statm where available (Linux), else via psutil
+    try:
+        with open('/proc/self/statm') as f:
+            f.read()
+        pagesize = os.sysconf('SC_PAGE_SIZE') / float(2 ** 20)
+    except (OSError, ValueError, AttributeError):
+        if psutil is None:
+            return lambda: float('nan')
+        process = psutil.Process(os.getpid())
+        return lambda: process.memory_info()[0] / float(2 ** 20)
+    def rss():
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * pagesize
+    return rss
+
+class MemorySampler:
+    """
+    Sample the resident memory of this process from a background thread.
+
+    The integration loop pays nothing per step: a daemon thread reads the
+    resident set size at a fixed rate and keeps the peak and a bounded
+    series of the most recent samples.
+
+    Parameters
+    ----------
+    rate : float
+        Samples per second.
+    maxlen : int
+        Number of most recent (time, MB) samples kept.
+
+    Examples
+    --------
+    >>> with MemorySampler() as mem:
+    ...     sim.integrate(tmax)
+    >>> mem.peak
+    """
+    def __init__(self, rate=10., maxlen=4096):
+        self.period = 1./rate
+        self.samples = collections.deque(maxlen=maxlen)
+        self.peak = 0.
+        self.elapsed = 0.               # time spent sampling (s)
+        self.nsamples = 0
+        self._rss = _statm_reader()
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    def sample(self):
+        """
+        Take one sample now and return it (MB).
+        """
+        start = time.perf_counter()
+        mem = self._rss()
+        self.samples.append((start - self._t0, mem))
+        self.elapsed += time.perf_counter() - start
+        self.nsamples += 1
+        if mem > self.peak:
+            self.peak = mem
+        return mem
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.sample()
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._stop.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        return self.peak
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def series(self):
+        """
+        Return the retained samples as an (N, 2) array of (s, MB).
+        """
+        return np.array(self.samples).reshape(-1, 2)
+
+    @property
+    def mean(self):
+        """
+        Mean of the retained samples (MB).
+        """
+        return self.series()[:, 1].mean()
+
+class Profile:
+    """
+    Accumulate wall time and call counts per phase of the integration loop.
+
+    Pass an instance as the `profile` argument of `evolve`. Each phase is
+    timed with two `time.perf_counter` calls and added to a running total,
+    so nothing is logged per call.
+
+    Examples
+    --------
+    >>> profile = Profile()
+    >>> evolve(sim, star, ts, profile=profile)
+    >>> print(profile)
+    """
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.wall = 0.                  # wall time of the profiled loops
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, name, start):
+        """
+        Add the time since `start` to phase `name`; return the current time
+        as the start of the next phase.
+        """
+        now = time.perf_counter()
+        self.times[name] = self.times.get(name, 0.) + now - start
+        self.calls[name] = self.calls.get(name, 0) + 1
+        return now
+
+    def add(self, name, elapsed, calls=1):
+        """
+        Add `elapsed` seconds over `calls` calls to phase `name`.
+        """
+        self.times[name] = self.times.get(name, 0.) + elapsed
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def rows(self):
+        """
+        Return (phase, calls, total s, us per call, share of wall time)
+        rows, including the unaccounted 'other' time of the loop.
+        """
+        rows = [(name, self.calls[name], t, 1e6*t/max(self.calls[name], 1),
+                 t/self.wall if self.wall else float('nan'))
+                for name, t in self.times.items()]
+        other = self.wall - sum(t for name, t in self.times.items()
+                                if not name.endswith('(thread)'))
+        if self.wall:
+            rows.append(('other', 0, other, float('nan'), other/self.wall))
+        return rows
+
+    def __str__(self):
+        lines = ['{:<18}{:>10}{:>14}{:>14}{:>9}'.format('phase', 'calls',
+                                                      'total (s)',
+                                                      'per call (us)',
+                                                      'share')]
+        for name, calls, t, per, share in self.rows():
+            if name == 'other':
+                lines.append('{:<18}{:>10}{:>14.3f}{:>14}{:>9.1%}'.format(
+                    name, '', t, '', share))
+            else:
+                lines.append('{:<18}{:>10d}{:>14.3f}{:>14.2f}{:>9.1%}'.format(
+                    name, calls, t, per, share))
+        lines.append('{:<18}{:>10}{:>14.3f}'.format('wall', '', self.wall))
+        return '\n'.join(lines)
+
+    def write(self, path='profile.txt'):
+        """
+        Write the summary table to `path`.
+        """
+        with open(path, 'w') as f:
+            f.write(str(self) + '\n')
+
+class _NoProfile:
+    # stand-in for an absent Profile, so timed code needs no branches
+    wall = 0.
+
+    def start(self):
+        return 0.
+
+    def lap(self, name, start):
+        return 0.
+
+    def add(self, name, elapsed, calls=1):
+        pass
+
+NOPROFILE = _NoProfile()
+
+def walltime(runtime):
+    """
+    Format a runtime in seconds as e.g. 'Wall time: 1h 2min 3s'.
+    """
+    h = runtime // 3600
+    remainder = runtime - h*3600
+    m = remainder // 60
+    s = remainder - m*60
+    if h != 0:
+        return 'Wall time: %dh %dmin %ds'%(h, m, s)
+    elif m != 0:
+        return 'Wall time: %dmin %ds'%(m, s)
+    else:
+        return 'Wall time: %ds'%(s)
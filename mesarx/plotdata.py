@@ -0,0 +1,159 @@
+"""
+Reduction of dense time series to what a plot can show.
+
+A line drawn across `n` pixel columns cannot show more than the first, last,
+lowest and highest point of each column. `minmax` keeps exactly those, so
+the rendered line (on any monotonic y scale, e.g. logarithmic) is unchanged
+while vector outputs hold a few points per column instead of every sample.
+`lttb` (largest triangle three buckets) instead keeps one representative
+point per bucket for a fixed point budget. `loadplot` reads a series through
+a cache of reduced copies at power-of-two resolutions next to the source
+file, so a figure build parses and reduces each output only once.
+"""
+import os
+import numpy as np
+from .output import readresults
+from .tracks import CACHEDIR, _store, filehash, loadtxt
+
+def _buckets(x, n, logx=False):
+    # index of the first sample of each of n equal-width x buckets
+    u = np.log10(x) if logx else x
+    edges = np.linspace(u[0], u[-1], n + 1)
+    starts = np.searchsorted(u, edges[:-1], side='left')
+    return np.unique(np.append(starts, x.size))
+
+def minmax(x, y, n, logx=False):
+    """
+    Keep the first, last, minimum and maximum point of each of `n` buckets.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        Series with increasing `x`.
+    n : int
+        Number of equal-width buckets in x, e.g. the plot width in pixels.
+    logx : bool
+        Whether the buckets are equal in log x (for a logarithmic x axis).
+        Samples at x <= 0 (e.g. t = 0), which such an axis cannot show, are
+        kept as they are.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        At most 4n points (plus any at x <= 0), in the original order.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if x.size <= 4*n:
+        return x, y
+    skip = np.searchsorted(x, 0., side='right') if logx else 0
+    if skip == x.size:
+        raise ValueError('logx needs samples at x > 0')
+    bounds = skip + _buckets(x[skip:], n, logx)
+    starts, ends = bounds[:-1], bounds[1:]
+    order = np.argsort(y, kind='stable')
+    rank = np.empty(y.size, dtype=np.intp)  # position of each y when sorted
+    rank[order] = np.arange(y.size)
+    lowest = order[np.minimum.reduceat(rank, starts)]
+    highest = order[np.maximum.reduceat(rank, starts)]
+    keep = [np.arange(skip), starts, ends - 1, lowest, highest]
+    index = np.unique(np.concatenate(keep))
+    return x[index], y[index]
+
+def lttb(x, y, n):
+    """
+    Downsample to `n` points by largest triangle three buckets.
+
+    The first and last points are kept; from each of the n - 2 buckets in
+    between, the point forming the largest triangle with the point kept
+    from the previous bucket and the mean of the next bucket is kept.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        Series with increasing `x`; pass e.g. ``np.log10(y)`` to preserve
+        shapes on a logarithmic y axis.
+    n : int
+        Number of points to keep (at least 3).
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if x.size <= n:
+        return x, y
+    bounds = np.linspace(1, x.size - 1, n - 1).astype(np.intp)
+    index = np.empty(n, dtype=np.intp)
+    index[0], index[-1] = 0, x.size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        nxt = slice(hi, bounds[i + 2] if i + 2 < n - 1 else x.size)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx)*(y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi])*(cy - y[a]))
+        a = lo + int(np.argmax(area))
+        index[i + 1] = a
+    return x[index], y[index]
+
+def _level(n):
+    # round n up to a power of two, so nearby resolutions share a cache entry
+    return 1 << max(int(n) - 1, 1).bit_length()
+
+def loadplot(path, n=2048, method='minmax', column=None, logx=False,
+             cache=True):
+    """
+    Load a series reduced for plotting at a resolution of `n` columns.
+
+    Parameters
+    ----------
+    path : str
+        Two-column text file (see `writetxt`) or results file (see
+        `writeresults`).
+    n : int
+        Plot width in pixels; rounded up to a power of two.
+    method : {'minmax', 'lttb'}
+        `minmax` with n buckets, or `lttb` with 4n points.
+    column : str or None
+        Column to read from a results file.
+    logx : bool
+        Whether the x axis is logarithmic (`minmax` only).
+    cache : bool
+        Whether to read (and populate) the reduced copies stored as
+        ``plot.<file>[.<column>].<method>[log]<level>.<hash>.npy`` under the
+        ``.npycache`` directory next to `path`; a changed source gets a new
+        hash.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+    """
+    if method not in ('minmax', 'lttb'):
+        raise ValueError("method must be 'minmax' or 'lttb'")
+    level = _level(n)
+    head, tail = os.path.split(path)
+    cachedir = os.path.join(head, CACHEDIR)
+    name = 'plot.{}{}.{}{}{}'.format(tail, '' if column is None else
+                                     '.' + column, method,
+                                     'log' if logx else '', level)
+    if cache:
+        cpath = os.path.join(cachedir, '{}.{}.npy'.format(name,
+                                                          filehash(path)))
+        try:
+            data = np.load(cpath)
+            return data[0], data[1]
+        except (OSError, ValueError):   # missing or corrupt cache
+            pass
+    if column is None:
+        x, y = loadtxt(path, cache)
+    else:
+        x, columns = readresults(path, [column])
+        y = columns[column]
+    if method == 'minmax':
+        x, y = minmax(x, y, level, logx)
+    else:
+        x, y = lttb(x, y, 4*level)
+    data = np.array([x, y])
+    if cache:
+        _store(data, cachedir, name, cpath)
+    return data[0], data[1]
@@ -0,0 +1,150 @@
+"""
+Analytic pre-screening of survey cells.
+
+For a circular orbit, adiabatic mass loss keeps b = a*(M + m) constant and
+constant time lag tides drive d(a^8)/dt = -48 k2 q(1+q) R^8/T (fig3.ipynb),
+with T = R^3/(G M tau), which is independent of a. Together,
+
+    b^8(t) = b0^8 - 48 k2 G int q(1+q) M tau R^5 (M + m)^8 dt,
+
+a closed form along the stellar track for every initial semimajor axis.
+Since the orbit collapses within a few update intervals once it touches the
+star, the distance to the surface says little about how certain the outcome
+is. Instead, a cell needs no integration if its fate is the same for initial
+semimajor axes a relative margin below and above its own.
+"""
+import time
+import numpy as np
+from .evolve import interpolate
+from .parallel import output_times, setup_case
+from .tracks import G
+
+ENGULFED = 'engulfed'
+SURVIVES = 'survives'
+UNCERTAIN = 'uncertain'
+
+def analytic_orbit(star, a0, m, tmax, k2=0.038, tides=True, nfine=100000):
+    """
+    Return the circular-orbit semimajor axis along the track.
+
+    Parameters
+    ----------
+    star : Star
+    a0 : float or numpy.ndarray
+        Initial semimajor axis (AU), or several.
+    m : float
+        Planet mass (Msun).
+    tmax : float
+        Integration time (yr).
+    k2 : float
+        Potential Love number of the star.
+    tides : bool
+        Whether to include tidal decay.
+    nfine : int
+        Number of uniformly spaced quadrature points, in addition to the
+        track knots in the interval.
+
+    Returns
+    -------
+    t : numpy.ndarray
+        Quadrature times (sim.t).
+    a : numpy.ndarray
+        Semimajor axis at `t` (zero once the orbit has decayed), with a
+        leading axis for each of several `a0`.
+    R : numpy.ndarray
+        Stellar radius at `t`.
+    """
+    rebx, T0 = star.rebx, star.T0
+    n = star.mass.Nvalues
+    knots = np.ctypeslib.as_array(star.mass.times, (n,)) - T0
+    t = np.union1d(np.linspace(0., tmax, nfine),
+                   knots[(knots > 0.) & (knots < tmax)])
+    M = interpolate(rebx, star.mass, T0 + t)
+    R = interpolate(rebx, star.radius, T0 + t)
+    Mt = M + m
+    b8 = np.multiply.outer((np.asarray(a0, dtype=float)*Mt[0])**8,
+                           np.ones(t.size))
+    if tides:
+        q = m/M
+        tau = interpolate(rebx, star.tau, T0 + t)
+        rate = 48.*k2*G*q*(1. + q)*M*tau*R**5*Mt**8
+        b8 -= np.concatenate(([0.], np.cumsum(0.5*(rate[1:] + rate[:-1])*
+                                              np.diff(t))))
+    a = np.maximum(b8, 0.)**0.125/Mt
+    return t, a, R
+
+def classify(case, margin=0.05, nfine=100000):
+    """
+    Classify a `run_case` case from its analytic circular orbit.
+
+    The orbit is evolved from the case's initial semimajor axis a0 and from
+    (1 - margin) a0 and (1 + margin) a0. The cell is ENGULFED if even the
+    outer orbit reaches the contact distance (stellar plus planet radius),
+    SURVIVES if even the inner one does not, and is UNCERTAIN otherwise,
+    i.e. within about `margin` of the analytic engulfment boundary.
+
+    Returns
+    -------
+    dict
+        `case` updated with the class 'screen', the analytic end time 't'
+        (the engulfment time if engulfed), final semimajor axis 'a_f',
+        'collision', 'runtime' and, if `case['record']` is set, 'ts' and
+        'as' on the same output grid as `run_case` (zero after
+        engulfment).
+    """
+    timer_start = time.perf_counter()
+    sim, star, ts = setup_case(case)
+    params = case.get('params', {})
+    k2 = params.get('tctl_k2', params.get('tctl_k1', 0.))
+    planet = sim.particles[1]
+    a0 = planet.orbit(primary=sim.particles[0]).a
+    a0s = a0*np.array([1. - margin, 1., 1. + margin])
+    t, a, R = analytic_orbit(star, a0s, planet.m, case['tmax'], k2,
+                             case.get('tides', True), nfine)
+    inside = a < R + planet.r
+    engulfed = inside.any(axis=1)       # inner, nominal, outer orbit
+    if engulfed[2]:
+        label = ENGULFED
+    elif not engulfed[0]:
+        label = SURVIVES
+    else:
+        label = UNCERTAIN
+    a = a[1]
+    t_end = t[np.argmax(inside[1])] if engulfed[1] else t[-1]
+    result = dict(case)
+    result.update(screen=label, t=t_end, collision=bool(engulfed[1]),
+                  a_f=np.interp(t_end, t, a), max_mem=np.nan)
+    if case.get('record'):
+        outs = output_times(case, ts)
+        as_ = np.interp(outs, t, a)
+        as_[outs > t_end] = 0.
+        result.update(ts=outs, **{'as': as_})
+    result['runtime'] = time.perf_counter() - timer_start
+    return result
+
+def prescreen(cases, margin=0.05, nfine=100000):
+    """
+    Split survey cases into those needing integration and screened results.
+
+    Parameters
+    ----------
+    cases : list of dict
+        `run_case` cases, e.g. from `grid`.
+    margin : float
+        Relative margin in initial semimajor axis; see `classify`.
+
+    Returns
+    -------
+    uncertain : list of dict
+        Cases to integrate.
+    screened : list of dict
+        `classify` results of the cells whose fate is certain.
+    """
+    uncertain, screened = [], []
+    for case in cases:
+        result = classify(case, margin, nfine)
+        if result['screen'] == UNCERTAIN:
+            uncertain.append(case)
+        else:
+            screened.append(result)
+    return uncertain, screened
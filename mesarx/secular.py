@@ -0,0 +1,310 @@
+"""
+Orbit-averaged (secular) evolution of a planet around an evolving star.
+
+Instead of resolving every orbit, the semimajor axis a, eccentricity e and
+stellar spin Omega follow the orbit-averaged equations of the constant time
+lag model of Hut (1981), in the normalization of REBOUNDx's
+"tides_constant_time_lag" (whose circular decay is the closed form used in
+fig3.ipynb), plus adiabatic mass loss, a*(M + m) = const. The star's mass,
+radius and time lag come from the same spline interpolators as in `evolve`.
+"""
+import time
+import numpy as np
+from .evolve import evolve, interpolate
+from .parallel import output_times, setup_case
+from .tracks import G
+
+# Dormand-Prince 5(4) tableau
+_C = np.array([0., 1/5, 3/10, 4/5, 8/9, 1., 1.])
+_A = [[],
+      [1/5],
+      [3/40, 9/40],
+      [44/45, -56/15, 32/9],
+      [19372/6561, -25360/2187, 64448/6561, -212/729],
+      [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+      [35/384, 0., 500/1113, 125/192, -2187/6784, 11/84]]
+_B = np.array([35/384, 0., 500/1113, 125/192, -2187/6784, 11/84, 0.])
+_E = _B - np.array([5179/57600, 0., 7571/16695, 393/640, -92097/339200,
+                    187/2100, 1/40])
+
+def _f(e2):
+    # eccentricity functions of Hut (1981)
+    f1 = 1 + e2*(31/2 + e2*(255/8 + e2*(185/16 + e2*25/64)))
+    f2 = 1 + e2*(15/2 + e2*(45/8 + e2*5/16))
+    f3 = 1 + e2*(15/4 + e2*(15/8 + e2*5/64))
+    f4 = 1 + e2*(3/2 + e2/8)
+    f5 = 1 + e2*(3 + e2*3/8)
+    return f1, f2, f3, f4, f5
+
+class SecularModel:
+    """
+    Right-hand side of the secular equations for one planet.
+
+    Parameters
+    ----------
+    star : Star
+        Supplies the mass, radius and time lag tracks (and the age T0).
+    m : float
+        Planet mass (Msun).
+    k2 : float
+        Potential Love number of the star ("tctl_k2").
+    r : float
+        Planet radius (AU), added to the stellar radius for engulfment.
+    tides : bool
+        Whether to include the tidal terms.
+    rg2 : float or None
+        Squared radius of gyration of the star, I/(M R^2). If None, the spin
+        Omega is held fixed, as REBOUNDx does.
+    """
+    def __init__(self, star, m, k2=0.038, r=0., tides=True, rg2=None):
+        self.star = star
+        self.m = m
+        self.k2 = k2
+        self.r = r
+        self.tides = tides
+        self.rg2 = rg2
+
+    def track(self, t):
+        """
+        Return the star's mass, dM/dt, radius, dR/dt and time lag at sim.t.
+        """
+        star, rebx, age = self.star, self.star.rebx, self.star.T0 + t
+        M = star.mass.interpolate(rebx, t=age)
+        dM = float(interpolate(rebx, star.mass, age, derivative=True))
+        R = star.radius.interpolate(rebx, t=age)
+        dR = float(interpolate(rebx, star.radius, age, derivative=True))
+        tau = star.tau.interpolate(rebx, t=age) if self.tides else 0.
+        return M, dM, R, dR, tau
+
+    def __call__(self, t, y):
+        a, e, Omega = y
+        if not (a > 0. and e < 1.):         # unbound trial stage; rejected
+            return np.full(3, np.nan)
+        M, dM, R, dR, tau = self.track(t)
+        Mt = M + self.m
+        da, de, dOmega = -a*dM/Mt, 0., 0.     # adiabatic mass loss
+        if self.rg2 is not None:              # spin-down as I = rg2 M R^2
+            dOmega = -Omega*(dM/M + 2.*dR/R)
+        if self.tides and tau > 0.:
+            q = self.m/M
+            n = np.sqrt(G*Mt/a**3)
+            rT = self.k2*G*M*tau/R**3         # k2/T of fig3.ipynb
+            e2 = e*e
+            f1, f2, f3, f4, f5 = _f(e2)
+            s = 1. - e2
+            s32 = s*np.sqrt(s)
+            x = R/a
+            da -= 6.*rT*q*(1. + q)*x**8*a/s**7.5*(f1 - s32*f2*Omega/n)
+            de -= 27.*rT*q*(1. + q)*x**8*e/s**6.5*(f3 - 11/18*s32*f4*Omega/n)
+            if self.rg2 is not None:
+                dOmega += (3.*rT*q*q/self.rg2*x**6*n/s**6*
+                           (f2 - s32*f5*Omega/n))
+        return np.array([da, de, dOmega])
+
+    def contact(self, t, y):
+        """
+        Periastron minus the contact distance; engulfment when negative.
+        """
+        a, e, Omega = y
+        return a*(1. - e) - self.star.radius.interpolate(
+            self.star.rebx, t=self.star.T0 + t) - self.r
+
+def _hermite(t, t0, h, y0, f0, y1, f1):
+    # cubic Hermite interpolation within an accepted step
+    s = (t - t0)/h
+    s = np.asarray(s)[..., None]
+    h00 = (1 + 2*s)*(1 - s)**2
+    h10 = s*(1 - s)**2
+    h01 = s*s*(3 - 2*s)
+    h11 = s*s*(s - 1)
+    return h00*y0 + h10*h*f0 + h01*y1 + h11*h*f1
+
+def integrate(model, y0, ts, rtol=1e-9, atol=1e-12, h0=None):
+    """
+    Integrate `model` with an adaptive Dormand-Prince 5(4) method.
+
+    Parameters
+    ----------
+    model : SecularModel
+    y0 : sequence
+        Initial (a, e, Omega) at ts[0].
+    ts : numpy.ndarray
+        Output times (sim.t), increasing.
+    rtol, atol : float
+        Relative and absolute tolerances of each step.
+    h0 : float or None
+        Initial step; a thousandth of the time span if None.
+
+    Returns
+    -------
+    ys : numpy.ndarray
+        (len(ts), 3) solution, zero after engulfment.
+    t_engulf : float
+        Time of engulfment (NaN if none), refined by bisection on the
+        interpolated solution.
+    nsteps : int
+        Number of accepted steps.
+    """
+    ys = np.zeros((ts.size, 3))
+    t, y = ts[0], np.array(y0, dtype=float)
+    ys[0] = y
+    f = model(t, y)
+    h = h0 or (ts[-1] - ts[0])/1e3
+    k = 1                               # next output
+    nsteps = 0
+    if model.contact(t, y) < 0.:
+        return ys, t, 0
+    while k < ts.size:
+        h = min(h, ts[-1] - t)
+        K = [f]
+        for i in range(1, 7):
+            K.append(model(t + _C[i]*h,
+                           y + h*sum(a*Ki for a, Ki in zip(_A[i], K))))
+        y1 = y + h*np.dot(_B, K)
+        err = h*np.dot(_E, K)
+        scale = atol + rtol*np.maximum(np.abs(y), np.abs(y1))
+        norm = np.sqrt(np.mean((err/scale)**2))
+        if not np.all(np.isfinite(y1)):
+            norm = np.inf
+        if norm > 1.:                   # reject and shrink
+            h *= max(0.2, 0.9*norm**-0.2) if np.isfinite(norm) else 0.2
+            continue
+        f1 = K[6]                       # FSAL
+        t1 = t + h
+        if model.contact(t1, y1) < 0.:
+            lo, hi = t, t1
+            while hi - lo > 1e-12*max(1., abs(hi)):
+                mid = 0.5*(lo + hi)
+                ym = _hermite(mid, t, h, y, f, y1, f1)
+                if model.contact(mid, ym) < 0.:
+                    hi = mid
+                else:
+                    lo = mid
+            kend = np.searchsorted(ts, hi, side='right')
+            if kend > k:
+                ys[k:kend] = _hermite(ts[k:kend], t, h, y, f, y1, f1)
+            return ys, hi, nsteps + 1
+        kend = np.searchsorted(ts, t1, side='right')
+        if kend > k:
+            ys[k:kend] = _hermite(ts[k:kend], t, h, y, f, y1, f1)
+            k = kend
+        t, y, f = t1, y1, f1
+        nsteps += 1
+        h *= min(5., 0.9*max(norm, 1e-10)**-0.2)
+    return ys, np.nan, nsteps
+
+def _model(case, sim, star):
+    params = case.get('params', {})
+    planet = sim.particles[1]
+    k2 = params.get('tctl_k2', params.get('tctl_k1', 0.))
+    return SecularModel(star, planet.m, k2=k2, r=planet.r,
+                        tides=case.get('tides', True), rg2=case.get('rg2'))
+
+def run_secular(case):
+    """
+    Evolve a case with the secular equations instead of N-body.
+
+    Parameters
+    ----------
+    case : dict
+        Run description as for `run_case`, plus optionally 'rg2' (see
+        `SecularModel`), the tolerance 'sec_rtol' (default 1e-9),
+        'check', the number of short N-body segments to compare against
+        (see `crosscheck`), and the largest relative deviation accepted by
+        that check, 'check_tol' (default 0.01).
+
+    Returns
+    -------
+    dict
+        As `run_case` ('t', 'a_f', 'collision' for engulfment, 'runtime',
+        'max_mem' as NaN, and 'ts'/'as' on the same output grid if
+        `case['record']`), plus 'e_f',
+        'nsteps' and, with 'check', the largest relative deviation of the
+        N-body segments 'check_err' and whether it is within 'check_tol',
+        'check_ok'.
+    """
+    timer_start = time.perf_counter()
+    sim, star, ts = setup_case(case)
+    model = _model(case, sim, star)
+    orbit = sim.particles[1].orbit(primary=sim.particles[0])
+    Omega = case.get('params', {}).get('Omega', 0.)
+    outs = output_times(case, ts)
+    ts = np.union1d(ts, outs)           # solution on both grids
+    ys, t_engulf, nsteps = integrate(model, (orbit.a, orbit.e, Omega), ts,
+                                     rtol=case.get('sec_rtol', 1e-9))
+    engulfed = not np.isnan(t_engulf)
+    last = ys[np.searchsorted(ts, t_engulf, 'right') - 1] if engulfed \
+        else ys[-1]
+    result = dict(case)
+    result.update(t=t_engulf if engulfed else ts[-1], a_f=last[0],
+                  e_f=last[1], collision=engulfed, nsteps=nsteps,
+                  max_mem=np.nan)
+    if case.get('record'):
+        result.update(ts=outs, **{'as': ys[np.searchsorted(ts, outs), 0]})
+    if case.get('check'):
+        checks = crosscheck(case, ts, ys, case['check'])
+        result['check_err'] = max(c['rel_err'] for c in checks) \
+            if checks else np.nan
+        result['check_ok'] = not result['check_err'] > case.get('check_tol',
+                                                                0.01)
+    result['runtime'] = time.perf_counter() - timer_start
+    return result
+
+def crosscheck(case, ts, ys, segments=3, duration=1e3, atol=1e-8):
+    """
+    Compare a secular solution against short N-body segments.
+
+    Each segment starts an N-body run (as `run_case` would, with the
+    case's update interval capped at a tenth of `duration`) with the planet
+    on the secular (a, e) at an evenly spaced time before any engulfment,
+    and compares the change of the semimajor axis over `duration`. (The
+    semimajor axis itself changes by little over a segment, so comparing
+    it would hide even grossly wrong secular rates.)
+
+    Parameters
+    ----------
+    case : dict
+    ts, ys : numpy.ndarray
+        Output times and solution of `integrate`.
+    segments : int
+    duration : float
+        Length of each segment (yr).
+    atol : float
+        Floor (AU) on the secular change that `rel_err` is relative to, so
+        an orbit that barely changes does not give an infinite error.
+
+    Returns
+    -------
+    list of dict
+        For each segment its start 't0', initial semimajor axis 'a0', the
+        secular and N-body semimajor axes after `duration`, 'a_secular' and
+        'a_nbody', and the difference of the N-body change a_nbody - a0 from
+        the secular change a_secular - a0, relative to the larger of the
+        latter and `atol`, 'rel_err'.
+    """
+    alive = np.flatnonzero(ys[:, 0] > 0.)
+    tend = ts[alive[-1]] - duration
+    checks = []
+    if tend <= ts[0]:
+        return checks
+    for t0 in np.linspace(ts[0], tend, segments):
+        a0, e0, Omega0 = (np.interp(t0, ts[alive], ys[alive, i])
+                          for i in range(3))
+        segment = dict(case, T0=case['T0'] + t0, tmax=duration,
+                       interval=min(case['interval'], duration/10.),
+                       record=False, rtol=None)
+        sim, star, seg_ts = setup_case(segment)
+        planet = sim.particles[1]       # re-add on the secular orbit
+        m, r = planet.m, planet.r
+        sim.remove(1)
+        sim.add(primary=sim.particles[0], m=m, r=r, a=a0, e=e0)
+        max_mem, error = evolve(sim, star, seg_ts,
+                                schedule=case.get('schedule', False))
+        if error is not None:
+            continue
+        a_sec = np.interp(t0 + duration, ts[alive], ys[alive, 0])
+        a_nb = sim.particles[1].a
+        checks.append(dict(t0=t0, a0=a0, a_secular=a_sec, a_nbody=a_nb,
+                           rel_err=abs(a_nb - a_sec)/max(abs(a_sec - a0),
+                                                         atol)))
+    return checks
@@ -0,0 +1,148 @@
+"""
+Simulation factory for star-planet systems around an evolving star.
+"""
+import numpy as np
+import rebound
+import reboundx
+
+def makesim(particles, integrator=None, dt=None, collision=None, tides=True,
+            com=False):
+    """
+    Create a REBOUND simulation with REBOUNDx attached.
+
+    Parameters
+    ----------
+    particles : list of dict or str
+        Particles to add in order, the star first. A dict is passed as
+        keyword arguments to `rebound.Simulation.add`, a str (e.g. 'Sun') is
+        looked up in NASA Horizons.
+    integrator : str or None
+        REBOUND integrator, e.g. "whfast". REBOUND's default if None.
+    dt : float or None
+        Integrator timestep (yr).
+    collision : str or None
+        REBOUND collision detection module, e.g. "direct".
+    tides : bool
+        Whether to load and add the "tides_constant_time_lag" force.
+    com : bool
+        Whether to move the particles to the centre-of-mass frame (`evolve`
+        recentres at its first update in any case).
+
+    Returns
+    -------
+    sim : rebound.Simulation
+    rebx : reboundx.Extras
+    """
+    sim = rebound.Simulation()
+    if integrator is not None:
+        sim.integrator = integrator
+    sim.units = ('yr', 'AU', 'Msun')
+    for p in particles:
+        if isinstance(p, str):
+            sim.add(p)
+        else:
+            sim.add(**p)
+    if collision is not None:
+        sim.collision = collision
+    if com:
+        sim.move_to_com()
+    if dt is not None:
+        sim.dt = dt
+    rebx = reboundx.Extras(sim)
+    if tides:
+        force = rebx.load_force("tides_constant_time_lag")
+        rebx.add_force(force)
+    return sim, rebx
+
+def makeensemble(M0, planets, tides=True):
+    """
+    Create a simulation of non-interacting planets around a single star.
+
+    The planets are test particles of the star (sim.N_active = 1): they keep
+    their masses for the tidal force but neither perturb each other nor
+    the star, so each evolves as in its own two-body simulation (up to the
+    star's reflex motion, which is neglected).
+
+    Parameters
+    ----------
+    M0 : float
+        Initial stellar mass (Msun).
+    planets : list of dict
+        Keyword arguments of each planet for `rebound.Simulation.add`.
+    tides : bool
+        Whether to load and add the "tides_constant_time_lag" force.
+
+    Returns
+    -------
+    sim : rebound.Simulation
+    rebx : reboundx.Extras
+    """
+    sim, rebx = makesim([dict(m=M0)], collision="direct", tides=tides)
+    for p in planets:                   # heliocentric, not Jacobi, elements
+        sim.add(primary=sim.particles[0], **p)
+    sim.N_active = 1
+    sim.testparticle_hidewarnings = 1   # massive test particles intended
+    if hasattr(sim, 'collision_resolve_keep_sorted'):
+        sim.collision_resolve_keep_sorted = 1 # always sorted in REBOUND >= 4
+    return sim, rebx
+
+def autointegrator(sim, tides=True, steps=20, rclose=3., hill=5.):
+    """
+    Choose the integrator and timestep of `sim` from its orbits.
+
+    Call once the star's radius is set (e.g. after `Star.setup`). The
+    policy, in order:
+
+    - IAS15 if tides are on and a planet's periastron is within `rclose`
+      stellar radii, where the velocity-dependent tidal force is strong and
+      engulfment has to be resolved;
+    - TRACE (MERCURIUS before REBOUND 4.4) with ``dt = P_min/steps`` if
+      neighbouring planets are closer than `hill` mutual Hill radii, so
+      close encounters are possible;
+    - otherwise WHFast with ``dt = P_min/steps``, safe mode off and an
+      11th-order symplectic corrector (`evolve` resynchronizes it after
+      parameter updates).
+
+    Here P_min is the shortest (heliocentric) orbital period.
+
+    Parameters
+    ----------
+    sim : rebound.Simulation
+        Star first, then the planets.
+    tides : bool
+        Whether the tidal force is on.
+    steps : int
+        Timesteps per shortest orbital period of the fixed-step integrators.
+    rclose : float
+        Periastron distance, in stellar radii, below which IAS15 is used.
+    hill : float
+        Mutual Hill separation below which encounters are assumed.
+
+    Returns
+    -------
+    str
+        The chosen integrator.
+    """
+    star = sim.particles[0]
+    orbits = [p.orbit(primary=star) for p in sim.particles[1:]]
+    a = np.array([o.a for o in orbits])
+    q = np.array([o.a*(1. - o.e) for o in orbits])
+    m = np.array([p.m for p in sim.particles[1:]])
+    P = np.array([o.P for o in orbits])
+    order = np.argsort(a)
+    a, m = a[order], m[order]
+    rhill = 0.5*(a[1:] + a[:-1])*np.cbrt((m[1:] + m[:-1])/(3.*star.m))
+    if (tides and np.any(q < rclose*star.r)) or np.any(a <= 0.):
+        sim.integrator = 'ias15'
+        return sim.integrator
+    if np.any(np.diff(a) < hill*rhill):
+        try:
+            sim.integrator = 'trace'
+        except ValueError:
+            sim.integrator = 'mercurius'
+    else:
+        sim.integrator = 'whfast'
+        sim.ri_whfast.safe_mode = 0
+        sim.ri_whfast.corrector = 11
+    sim.dt = np.min(P[P > 0.])/steps
+    return sim.integrator
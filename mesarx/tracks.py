@@ -0,0 +1,191 @@
+"""
+Loading and precalculation of MESA stellar evolution tracks.
+"""
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+RSUN = 0.00465047                       # Rsun in AU (215 Rsun ~ 1 AU)
+LSUN = 3.828e26                         # Lsun in W (IAU Resolution B3)
+WATT = ((6.7e-12)**2)*(5e-31)/((3.2e-8)**3) # W in sim units
+G = 4*np.pi**2                          # units of AU, yr, and Msun
+CACHEDIR = '.npycache'                  # binary track cache, next to sources
+
+def loadtxt(path, cache=True):
+    """
+    Load a two-column (time, value) text file as written by `writetxt`.
+
+    The first load parses the text and stores both columns in a binary
+    ``.npy`` file under a ``.npycache`` directory next to `path`, keyed by a
+    content hash of the text file; later loads memory-map that file instead
+    of parsing. A changed text file gets a new hash and is parsed again, and
+    an unwritable cache directory silently falls back to parsing.
+
+    Parameters
+    ----------
+    path : str
+        Path of the text file.
+    cache : bool
+        Whether to use (and populate) the binary cache.
+
+    Returns
+    -------
+    times, values : numpy.ndarray
+    """
+    if not cache:
+        data = np.loadtxt(path).T       # return (2, N) array
+        return data[0], data[1]
+    head, tail = os.path.split(path)
+    cachedir = os.path.join(head, CACHEDIR)
+    cpath = os.path.join(cachedir, '{}.{}.npy'.format(tail, filehash(path)))
+    try:
+        data = np.load(cpath, mmap_mode='r')
+    except (OSError, ValueError):       # missing or corrupt cache
+        data = np.ascontiguousarray(np.loadtxt(path).T)
+        _store(data, cachedir, tail, cpath)
+    return data[0], data[1]
+
+def filehash(path, blocksize=2**20):
+    """
+    Return a hex digest of the contents of the file at `path`.
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def _store(data, cachedir, name, cpath):
+    # write atomically, so concurrent jobs never see a partial file, and
+    # drop caches of earlier versions of the same source
+    try:
+        os.makedirs(cachedir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cachedir, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp, cpath)
+        for fname in os.listdir(cachedir):
+            stale = os.path.join(cachedir, fname)
+            if fname.startswith(name + '.') and stale != cpath:
+                os.remove(stale)
+    except OSError:
+        pass
+
+DERIVED = np.dtype([('radius', 'f8'),  # AU
+                    ('lumin', 'f8'),   # sim units
+                    ('t_f', 'f8'),     # convective friction time (Eq. 1)
+                    ('tau', 'f8')])    # tidal time lag (Eq. 2)
+
+def derive(masses, Rsuns, Lsuns, out=None):
+    """
+    Compute the derived columns of a stellar track in one vectorized pass.
+
+    Parameters
+    ----------
+    masses : numpy.ndarray
+        Stellar masses in Msun.
+    Rsuns : numpy.ndarray
+        Stellar radii in Rsun units, on the same rows as `masses`.
+    Lsuns : numpy.ndarray
+        Stellar luminosities in Lsun units, on the same rows as `masses`.
+    out : numpy.ndarray or None
+        Structured array of dtype `DERIVED` and the same length to fill in
+        place; a new one is allocated if None.
+
+    Returns
+    -------
+    numpy.ndarray
+        Structured array with fields 'radius', 'lumin', 't_f' and 'tau'.
+    """
+    if out is None:
+        out = np.empty(masses.size, dtype=DERIVED)
+    radius, lumin, t_f, tau = (out[name] for name in DERIVED.names)
+    np.multiply(Rsuns, RSUN, out=radius)            # convert Rsun to AU
+    np.multiply(Lsuns, LSUN*WATT, out=lumin)        # convert Lsun to sim units
+    np.multiply(radius, radius, out=t_f)            # t_f (Eq. 1)
+    t_f *= masses
+    t_f /= lumin
+    np.cbrt(t_f, out=t_f)
+    np.multiply(radius, radius, out=tau)            # tau (Eq. 2)
+    tau *= radius
+    tau *= 2./G
+    tau /= masses
+    tau /= t_f
+    return out
+
+def calc_taus(masses, Rsuns, Lsuns):
+    """
+    Precalculate the constant tidal time lag of a convective star.
+
+    Returns
+    -------
+    numpy.ndarray
+        Tidal time lags tau (Eq. 2) in sim units; see `derive`.
+    """
+    return np.ascontiguousarray(derive(masses, Rsuns, Lsuns)['tau'])
+
+class StellarTrack:
+    """
+    Time series of stellar mass, radius and (optionally) tidal time lag.
+
+    Each quantity carries its own time column, since e.g. the mass track
+    interpolated in Fig. 6 is a modified copy of the one used for tau.
+
+    Attributes
+    ----------
+    mtimes, masses : numpy.ndarray
+        Stellar ages and masses (Msun).
+    rtimes, radii : numpy.ndarray
+        Stellar ages and radii (AU).
+    ltimes, taus : numpy.ndarray or None
+        Stellar ages and tidal time lags (sim units), if a luminosity track
+        was supplied.
+    """
+    def __init__(self, mtimes, masses, rtimes, radii, ltimes=None, taus=None):
+        self.mtimes = mtimes
+        self.masses = masses
+        self.rtimes = rtimes
+        self.radii = radii
+        self.ltimes = ltimes
+        self.taus = taus
+
+    @property
+    def has_taus(self):
+        return self.taus is not None
+
+def loadtrack(path='input', m='m.txt', r='r.txt', l='l.txt', m_tau=None,
+              cache=True):
+    """
+    Load MESA mass, radius and luminosity tracks exported by ``mesa2txt``.
+
+    Parameters
+    ----------
+    path : str
+        Directory containing the track files.
+    m, r, l : str or None
+        Filenames of the mass (Msun), radius (Rsun) and luminosity (Lsun)
+        tracks. Pass ``l=None`` to skip the tidal time lag.
+    m_tau : str or None
+        Filename of the mass track to pair with `r` and `l` row by row when
+        computing tau, if different from the interpolated mass track `m`.
+    cache : bool
+        Whether to read the tracks through the binary cache of `loadtxt`.
+
+    Returns
+    -------
+    StellarTrack
+    """
+    mtimes, masses = loadtxt(os.path.join(path, m), cache)
+    rtimes, Rsuns = loadtxt(os.path.join(path, r), cache)
+    radii = Rsuns * RSUN
+    if l is None:
+        return StellarTrack(mtimes, masses, rtimes, radii)
+    ltimes, Lsuns = loadtxt(os.path.join(path, l), cache)
+    if m_tau is None:
+        tmasses = masses
+    else:
+        tmasses = loadtxt(os.path.join(path, m_tau), cache)[1]
+    derived = derive(tmasses, Rsuns, Lsuns)
+    taus = np.ascontiguousarray(derived['tau'])
+    return StellarTrack(mtimes, masses, rtimes, radii, ltimes, taus)